@@ -0,0 +1,193 @@
+"""Benchmark of cancelling a request while its response is being streamed by a slow local server.
+
+The server sends a chunk every `chunk_interval_ms`. Once a few chunks have arrived the request
+is cancelled, and measured are the time to the last chunk passed to the handler (quiet) and to
+the worker being stopped, with the handler as is and wrapped by `ActiveRequest.wrap`, which drops
+whatever arrives after the cancel. The worker is `llm_runner.Worker` if it's installed, otherwise
+a stand-in one reading the stream on a thread, which notices the cancel only after the next chunk.
+
+Usage:
+    python benchmarks/bench_cancellation.py [requests] [chunk_interval_ms]
+"""
+
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.request_registry import ActiveRequest  # noqa: E402
+
+CHUNK_INTERVAL = 0.2  # seconds
+CHUNKS = 100
+CANCEL_AFTER_CHUNKS = 3
+QUIET_WINDOW = 1  # seconds watched for chunks and the worker stopping after the cancel
+
+
+class SlowCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for number in range(CHUNKS):
+                delta = {'content': f'word{number} '}
+                chunk = {'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]}
+                self.write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode())
+                time.sleep(CHUNK_INTERVAL)
+            self.write_chunk(b'data: [DONE]\n\n')
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client has cancelled
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, *args: Any):
+        pass
+
+
+class StandInWorker:
+    """Streams the response on a thread, checks for a cancel only after a chunk has been handled."""
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self.cancelled = threading.Event()
+        self.thread: threading.Thread | None = None
+
+    def run(self, handler: Callable[[str], None]):
+        def stream():
+            connection = http.client.HTTPConnection('127.0.0.1', self.port)
+            connection.request('POST', '/v1/chat/completions', '{}', {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            for line in response:
+                if line.startswith(b'data: {'):
+                    handler(json.loads(line[6:])['choices'][0]['delta']['content'])
+                    if self.cancelled.is_set():
+                        break
+            connection.close()
+
+        self.thread = threading.Thread(target=stream, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_alive(self) -> bool:
+        return bool(self.thread and self.thread.is_alive())
+
+
+def measure(start: Callable[[Callable[[str], None]], Any], gated: bool) -> Tuple[float, float | None]:
+    """Returns the seconds from the cancel to the last handled chunk and to the worker being stopped"""
+    chunks = threading.Semaphore(0)
+    last_chunk = [0.0]
+
+    def handler(_content: str) -> None:
+        last_chunk[0] = time.perf_counter()
+        chunks.release()
+
+    request = ActiveRequest(1, 1, None, None, 'bench')
+    worker = start(request.wrap(handler) if gated else handler)
+    request.worker = worker
+    for _ in range(CANCEL_AFTER_CHUNKS):
+        chunks.acquire(timeout=10)
+
+    cancelled = time.perf_counter()
+    if gated:
+        request.cancel()
+    worker.cancel()
+
+    stopped: float | None = None
+    while time.perf_counter() - cancelled < QUIET_WINDOW:
+        if stopped is None and not worker.is_alive():
+            stopped = time.perf_counter() - cancelled
+        time.sleep(0.001)
+    return max(0.0, last_chunk[0] - cancelled), stopped
+
+
+def report(name: str, timings: List[Tuple[float, float | None]]):
+    quiet = statistics.median(value for value, _ in timings) * 1000
+    stopped = [value for _, value in timings if value is not None]
+    stopped_text = f'{statistics.median(stopped) * 1000:7.1f} ms' if stopped else f'over {QUIET_WINDOW}s'
+    print(f'{name:32} quiet after {quiet:7.1f} ms, stopped after {stopped_text}')
+
+
+def main():
+    global CHUNK_INTERVAL
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    CHUNK_INTERVAL = (int(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowCompletionHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    print(f'{requests} requests, a chunk every {CHUNK_INTERVAL * 1000:.0f} ms')
+
+    try:
+        from llm_runner import (  # type: ignore
+            AssistantSettings,
+            InputKind,
+            PromptMode,
+            SublimeInputContent,
+            Worker,
+        )
+    except ImportError:
+        Worker = None
+        print('llm_runner is not installed, a stand-in worker is used')
+
+    with tempfile.TemporaryDirectory() as cache_path:
+        if Worker is None:
+
+            def start(handler: Callable[[str], None]) -> Any:
+                worker = StandInWorker(port)
+                worker.run(handler)
+                return worker
+
+        else:
+            assistant = AssistantSettings(
+                {
+                    'name': 'mock',
+                    'chat_model': 'mock',
+                    'url': f'http://127.0.0.1:{port}/v1/chat/completions',
+                    'token': 'dummy',
+                    'output_mode': 'view',
+                    'stream': True,
+                }
+            )
+
+            def start(handler: Callable[[str], None]) -> Any:
+                worker = Worker(window_id=1, path=cache_path, proxy=None)
+                worker.run(
+                    1,
+                    PromptMode.View,
+                    [SublimeInputContent(InputKind.Command, 'Hi')],
+                    assistant,
+                    handler,
+                    lambda _error: None,
+                    lambda _name, _args: '',
+                )
+                return worker
+
+        try:
+            report('handler as is', [measure(start, gated=False) for _ in range(requests)])
+            report('handler gated by the request', [measure(start, gated=True) for _ in range(requests)])
+        finally:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Benchmark of `read_region_content` line range reads from large files.
+
+Generates a log file of the given size and reads a few line ranges from its head,
+middle and tail through `LineIndex`, which scans the file only as far as needed.
+
+Usage:
+    python benchmarks/bench_file_reader.py [megabytes]
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.file_reader import LineIndex  # noqa: E402
+
+
+def generate(path: str, megabytes: int) -> int:
+    line = '2024-01-01 12:00:00 INFO worker: processed request with a moderately long payload\n'
+    count = megabytes * 1024 * 1024 // len(line)
+    with open(path, 'w') as file:
+        for _ in range(count // 1000):
+            file.write(line * 1000)
+    return count // 1000 * 1000
+
+
+def measure(path: str, first: int, last: int | None) -> float:
+    start = time.perf_counter()
+    LineIndex(path).read(first, last)
+    return time.perf_counter() - start
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'big.log')
+        lines = generate(path, megabytes)
+        print(f'{megabytes} MB, {lines} lines')
+        for first, last in ((10, 40), (lines // 2, lines // 2 + 30), (lines - 30, None)):
+            elapsed = measure(path, first, last) * 1000
+            print(f'lines {first}..{last if last is not None else "end"}: {elapsed:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark of the phantom markdown rendering while streaming a long answer.
+
+Streams a synthetic ~50 KB answer in 5-token chunks and compares the full re-render
+of the accumulated text (the former `PhantomStreamer` behaviour) against
+`IncrementalMarkdownRenderer`. Python-Markdown (the engine behind mdpopups) stands in
+for `mdpopups.md2html`, which isn't available outside of Sublime Text.
+
+Usage:
+    pip install markdown
+    python benchmarks/bench_markdown_renderer.py
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import sys
+import time
+from typing import Callable, List
+
+import markdown
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.markdown_renderer import IncrementalMarkdownRenderer  # noqa: E402
+
+ANSWER_SIZE = 50 * 1024
+TOKENS_PER_CHUNK = 5
+
+SECTION = """<think>
+The user asks about the parser, let me look at the code closely first.
+</think>
+
+## Step {index}
+
+The function below walks over the `lines` of the file and collects every hunk it meets,
+so the complexity stays linear in the size of the input.
+
+- first it strips the prefix
+- then it **normalizes** the indentation
+- finally it stores the block
+
+```python
+def collect_{index}(lines):
+    hunks = []
+    for line in lines:
+        if line.startswith('-'):
+            hunks.append(line[1:])
+    return hunks
+```
+
+1. Run the tests.
+2. Check the output panel.
+
+"""
+
+
+def synthetic_answer(size: int) -> str:
+    sections: List[str] = []
+    index = 0
+    while sum(len(section) for section in sections) < size:
+        sections.append(SECTION.format(index=index))
+        index += 1
+    return ''.join(sections)
+
+
+def split_tokens(text: str, tokens_per_chunk: int) -> List[str]:
+    tokens = re.findall(r'\s*\S+', text, flags=re.S)
+    return [''.join(tokens[i : i + tokens_per_chunk]) for i in range(0, len(tokens), tokens_per_chunk)]
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def stream(chunks: List[str], render: Callable[[str], str]) -> List[float]:
+    timings: List[float] = []
+    completion = ''
+    for chunk in chunks:
+        completion += chunk
+        start = time.perf_counter()
+        render(completion)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def render_block(block: str) -> str:
+    return markdown.markdown(block, extensions=['fenced_code'])
+
+
+def main():
+    chunks = split_tokens(synthetic_answer(ANSWER_SIZE), TOKENS_PER_CHUNK)
+    chars = sum(len(chunk) for chunk in chunks)
+    print(f'answer: {chars} chars, {len(chunks)} chunks of {TOKENS_PER_CHUNK} tokens')
+
+    results = [
+        ('full re-render', stream(chunks, render_block)),
+        ('incremental', stream(chunks, IncrementalMarkdownRenderer(render_block).render)),
+    ]
+
+    for name, timings in results:
+        p99 = percentile(timings, 0.99) * 1000
+        print(f'{name:>15}: total {sum(timings):8.3f} s, p99 per chunk {p99:8.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark of the project file index on a generated 100k files tree.
+
+Compares the cold index build, a warm full-tree query and incremental updates
+(a saved file, a new file, a new directory picked by the mtime sweep) against
+a plain `IgnoreChecker` walk which hits the disk on every query.
+
+Usage:
+    python benchmarks/bench_project_index.py [files_count]
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.project_index import ProjectIndex  # noqa: E402
+from plugins.project_structure import IgnoreChecker  # noqa: E402
+
+FILES_PER_DIR = 100
+DIRS_PER_LEVEL = 10
+
+
+def generate_tree(root: str, files_count: int):
+    subprocess.run(['git', 'init', '-q', root], check=True)
+    with open(os.path.join(root, '.gitignore'), 'w') as file:
+        file.write('node_modules/\n*.log\n')
+
+    created = 0
+    top = 0
+    while created < files_count:
+        for sub in range(DIRS_PER_LEVEL):
+            directory = os.path.join(root, f'pkg_{top}', f'mod_{sub}')
+            os.makedirs(directory)
+            for i in range(FILES_PER_DIR):
+                name = f'file_{i}.py' if i % 10 else f'file_{i}.log'
+                with open(os.path.join(directory, name), 'w') as file:
+                    file.write('x' * i)
+            created += FILES_PER_DIR
+        top += 1
+
+    ignored = os.path.join(root, 'node_modules', 'dep')
+    os.makedirs(ignored)
+    for i in range(FILES_PER_DIR):
+        open(os.path.join(ignored, f'index_{i}.js'), 'w').close()
+
+
+def measure(name: str, action: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - start
+    print(f'{name:>32}: {elapsed * 1000:10.2f} ms')
+    return elapsed
+
+
+def consume(walker) -> int:
+    return sum(len(dirs) + len(files) for _, dirs, files in walker)
+
+
+def main():
+    files_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        generate_tree(root, files_count)
+        print(f'generated {files_count} files in {time.perf_counter() - start:.1f} s\n')
+
+        checker = IgnoreChecker(root)
+        measure('uncached IgnoreChecker walk', lambda: consume(checker.walk(root)))
+        measure('mtime cached IgnoreChecker walk', lambda: consume(checker.walk(root)))
+        checker.close()
+
+        index = ProjectIndex(root)
+        measure('index cold build', index.build)
+        print(f'{"entries":>32}: {consume(index.walk(root)):10d}')
+        measure('index warm query (full tree)', lambda: consume(index.walk(root)))
+        measure('index warm query (subtree)', lambda: consume(index.walk(os.path.join(root, 'pkg_0'))))
+
+        saved = os.path.join(root, 'pkg_0', 'mod_0', 'file_1.py')
+        with open(saved, 'a') as file:
+            file.write('changed')
+        measure('incremental update (saved file)', lambda: index.update_file(saved))
+
+        created = os.path.join(root, 'pkg_0', 'mod_0', 'new_file.py')
+        open(created, 'w').close()
+        measure('incremental update (new file)', lambda: index.update_file(created))
+
+        os.makedirs(os.path.join(root, 'pkg_1', 'new_module'))
+        open(os.path.join(root, 'pkg_1', 'new_module', 'a.py'), 'w').close()
+        measure('mtime sweep (new directory)', index.validate)
+        assert index.file_info(os.path.join(root, 'pkg_1', 'new_module', 'a.py')) is not None
+        assert index.file_info(created) is not None
+
+        index.checker.close()
+
+
+if __name__ == '__main__':
+    main()
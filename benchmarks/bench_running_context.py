@@ -0,0 +1,93 @@
+"""Benchmark of the `openai_worker_running` key binding context query, which runs on every ctrl+c.
+
+Compares the former query (two debug log calls and two `is_alive()` calls into the worker) with
+the `RequestRegistry.is_running` lookup it's been replaced with, while idle and while a request
+of the window is streaming. The worker is `llm_runner.Worker` if it's installed, a stand-in otherwise.
+
+Usage:
+    python benchmarks/bench_running_context.py [queries]
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.request_registry import ActiveRequest, RequestRegistry  # noqa: E402
+
+WINDOW_ID = 1
+
+logger = logging.getLogger('bench')
+logger.addHandler(logging.NullHandler())
+logger.propagate = False  # at the debug level the records are built and handled, but not printed
+
+
+class StandInWorker:
+    def __init__(self, alive: bool) -> None:
+        self.alive = alive
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+
+def per_query_ns(query: Callable[[], Any], queries: int) -> float:
+    start = time.perf_counter()
+    for _ in range(queries):
+        query()
+    return (time.perf_counter() - start) / queries * 1e9
+
+
+def former_query(worker: Any) -> Callable[[], Any]:
+    def query():
+        logger.debug('key == openai_worker_running')
+        logger.debug('CommonMethods.worker_thread is alive: %s', worker.is_alive() if worker else False)
+        return worker and worker.is_alive()
+
+    return query
+
+
+def registry_query(registry: RequestRegistry) -> Callable[[], Any]:
+    def query():
+        return registry.is_running() and registry.is_running(WINDOW_ID)
+
+    return query
+
+
+def main():
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as cache_path:
+        try:
+            from llm_runner import Worker  # type: ignore
+
+            idle_worker: Any = Worker(window_id=WINDOW_ID, path=cache_path, proxy=None)
+            print('worker: llm_runner.Worker')
+        except ImportError:
+            idle_worker = StandInWorker(alive=False)
+            print('worker: stand-in, llm_runner is not installed')
+        streaming_worker = StandInWorker(alive=True)
+
+        idle = RequestRegistry()
+        streaming = RequestRegistry()
+        url = 'https://api.openai.com/v1/chat/completions'
+        streaming.add(ActiveRequest(WINDOW_ID, 1, url, streaming_worker, 'bench'))
+
+        print(f'{queries} queries, ns per query')
+        for level in (logging.WARNING, logging.DEBUG):
+            logger.setLevel(level)
+            name = logging.getLevelName(level).lower()
+            for state, worker in (('idle', idle_worker), ('streaming', streaming_worker)):
+                label = f'former, {state}, log level {name}:'
+                print(f'{label:40} {per_query_ns(former_query(worker), queries):8.0f}')
+        for state, registry in (('idle', idle), ('streaming', streaming)):
+            label = f'registry, {state}:'
+            print(f'{label:40} {per_query_ns(registry_query(registry), queries):8.0f}')
+
+
+if __name__ == '__main__':
+    main()
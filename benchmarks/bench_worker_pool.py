@@ -0,0 +1,154 @@
+"""Benchmark of pooled workers against a local stand-in OpenAI-compatible server.
+
+The server streams a short chat completion and sleeps on every new connection to stand for
+the TCP + TLS + proxy CONNECT setup. The time to the first chunk is measured for a new
+`llm_runner.Worker` per request (as before the pool) and for workers taken from `WorkerPool`,
+which shows whether a reused worker keeps its connection at all. Without `llm_runner` installed
+only the plain HTTP baseline (new vs kept-alive connection) runs, which says nothing about workers.
+`WorkerPool.stats()` "setup" is the time spent getting the worker object, not any network setup.
+
+Usage:
+    python benchmarks/bench_worker_pool.py [requests] [connect_delay_ms]
+"""
+
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plugins.worker_pool import WorkerPool  # noqa: E402
+
+CONNECT_DELAY = 0.3  # seconds
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def setup(self):
+        time.sleep(CONNECT_DELAY)  # a new connection
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        deltas = [{'role': 'assistant', 'content': word} for word in ('Hello', ', ', 'world', '!')]
+        chunks = [{'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}]} for delta in deltas]
+        body = ''.join(f'data: {json.dumps(chunk)}\n\n' for chunk in chunks) + 'data: [DONE]\n\n'
+        data = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args: Any):
+        pass
+
+
+def http_baseline(port: int, requests: int):
+    payload = json.dumps({'model': 'mock', 'stream': True, 'messages': []})
+
+    def request(connection: http.client.HTTPConnection) -> float:
+        start = time.perf_counter()
+        connection.request('POST', '/v1/chat/completions', payload, {'Content-Type': 'application/json'})
+        connection.getresponse().read()
+        return time.perf_counter() - start
+
+    fresh = []
+    for _ in range(requests):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        fresh.append(request(connection))
+        connection.close()
+
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    request(connection)  # the first request opens the connection
+    kept = [request(connection) for _ in range(requests)]
+    connection.close()
+    print(f'http, new connection:  {statistics.median(fresh) * 1000:7.1f} ms')
+    print(f'http, kept connection: {statistics.median(kept) * 1000:7.1f} ms')
+
+
+def worker_benchmark(port: int, requests: int):
+    try:
+        from llm_runner import (  # type: ignore
+            AssistantSettings,
+            InputKind,
+            PromptMode,
+            SublimeInputContent,
+            Worker,
+        )
+    except ImportError:
+        print('llm_runner is not installed, skipping the worker benchmark')
+        return
+
+    assistant = AssistantSettings(
+        {
+            'name': 'mock',
+            'chat_model': 'mock',
+            'url': f'http://127.0.0.1:{port}/v1/chat/completions',
+            'token': 'dummy',
+            'output_mode': 'view',
+            'stream': True,
+        }
+    )
+
+    def first_chunk_time(get_worker: Callable[[], Any]) -> float:
+        start = time.perf_counter()
+        first = threading.Event()
+        worker = get_worker()
+        worker.run(
+            1,
+            PromptMode.View,
+            [SublimeInputContent(InputKind.Command, 'Hi')],
+            assistant,
+            lambda _content: first.set(),
+            lambda error: print('error:', error),
+            lambda _name, _args: '',
+        )
+        first.wait(10)
+        elapsed = time.perf_counter() - start
+        while worker.is_alive():
+            time.sleep(0.005)
+        return elapsed
+
+    with tempfile.TemporaryDirectory() as cache_path:
+        fresh: List[float] = [
+            first_chunk_time(lambda: Worker(window_id=1, path=cache_path, proxy=None))
+            for _ in range(requests)
+        ]
+        pool = WorkerPool(Worker)
+        pooled: List[float] = [
+            first_chunk_time(lambda: pool.acquire(1, cache_path, assistant.url, None)[0])
+            for _ in range(requests)
+        ]
+    print(f'worker per request, first chunk: {statistics.median(fresh) * 1000:7.1f} ms')
+    print(f'pooled worker, first chunk:      {statistics.median(pooled) * 1000:7.1f} ms  {pool.stats()}')
+
+
+def main():
+    global CONNECT_DELAY
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    CONNECT_DELAY = (int(sys.argv[2]) if len(sys.argv) > 2 else 300) / 1000
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), CompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    print(f'{requests} requests, {CONNECT_DELAY * 1000:.0f} ms per new connection')
+    try:
+        http_baseline(port, requests)
+        worker_benchmark(port, requests)
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ from .plugins.active_view_event import ActiveViewEventListener  # noqa: E402, F4
 from .plugins.buffer import (  # noqa: E402, F401
     EraseRegionCommand,
     ReplaceRegionCommand,
+    ReplaceRegionsCommand,
     TextStreamAtCommand,
 )
 from .plugins.sheet_toggle import ToggleViewAiContextIncludedCommand, SelectSheetsWithAiContextIncludedCommand  # noqa: E402, F401
@@ -17,8 +18,10 @@ from .plugins.openai import Openai  # noqa: E402, F401
 from .plugins.openai_panel import OpenaiPanelCommand  # noqa: E402, F401
 from .plugins.output_panel import SharedOutputPanelListener  # noqa: E402, F401
 from .plugins.phantom_streamer import PhantomStreamer  # noqa: E402, F401
+from .plugins.project_index_event import ProjectIndexListener  # noqa: E402, F401
 from .plugins.settings_reloader import ReloadSettingsListener  # noqa: E402, F401
 from .plugins.stop_worker_execution import (  # noqa: E402
+    OpenaiCancelRequestCommand,  # noqa: F401
     StopOpenaiExecutionCommand,  # noqa: F401
 )
 from .plugins.worker_running_context import (  # noqa: E402,
@@ -8,8 +8,11 @@ from llm_runner import AssistantSettings  # type: ignore
 from sublime import View
 from sublime_plugin import EventListener
 
+from .buffer import forget_snapshot
+from .context_packer import forget_edits, record_edit
 from .load_model import get_model_or_default
 from .openai_base import get_marked_sheets
+from .sheet_toggle import VIEW_TOGGLE_KEY
 from .status_bar import StatusBarMode
 
 logger = logging.getLogger(__name__)
@@ -32,6 +35,15 @@ class ActiveViewEventListener(EventListener):
 
         self.update_status_bar(view, assistant, status_hint_options)
 
+    def on_modified_async(self, view: View):
+        # Recently edited lines of marked sheets are kept when the sheets are trimmed to fit the context
+        if view.settings().get(VIEW_TOGGLE_KEY, False) and len(view.sel()) > 0:
+            record_edit(view.id(), view.rowcol(view.sel()[0].b)[0])
+
+    def on_close(self, view: View):
+        forget_edits(view.id())
+        forget_snapshot(view.id())
+
     def update_status_bar(
         self,
         view: View,
@@ -8,3 +8,4 @@ class CommandMode(Enum):
     refresh_output_panel = 'refresh_output_panel'
     create_new_tab = 'create_new_tab'
     reset_chat_history = 'reset_chat_history'
+    load_older_history = 'load_older_history'
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+import os
 from typing import Dict, List, Tuple
 
 from sublime import Edit, Region, Sheet, View
@@ -8,6 +9,9 @@ from sublime_plugin import TextCommand
 from sublime_types import Point
 from llm_runner import SublimeInputContent, InputKind  # type: ignore
 
+from .context_packer import PackedSheet, SheetSource, pack_sheets, recent_edits
+from .sent_sheets import SentSheets
+
 logger = logging.getLogger(__name__)
 
 
@@ -34,30 +38,144 @@ class BufferContentManager:
             wrapped_content = content
         else:
             wrapped_content = f'```{scope_name}\n{content}\n```'
-        logger.debug(f'wrapped_content {wrapped_content}')
+        logger.debug('wrapped_content %s', wrapped_content)
         return wrapped_content
 
     @staticmethod
-    def wrap_sheet_contents_with_scope(sheets: List[Sheet]) -> List[SublimeInputContent]:
+    def wrap_sheet_contents_with_scope(
+        sheets: List[Sheet], token_budget: int = 0, sent: SentSheets | None = None
+    ) -> List[SublimeInputContent]:
+        """Wraps the `sheets` content, with `sent` given a sheet sent earlier in the chat
+        is replaced by its diff"""
         items = []
 
-        if sheets:
-            for sheet in sheets:
-                view = sheet.view()
-                if not view:
-                    continue  # If for some reason the sheet cannot be converted to a view, skip.
+        for view, packed in BufferContentManager.pack_sheets(sheets, token_budget):
+            scope_region = view.scope_name(0)  # Assuming you want the scope at the start of the document
+            scope_name = scope_region.split(' ')[0].split('.')[-1]
+
+            file_path = view.file_name()
+
+            delta = sent.delta(file_path, packed.content) if sent and file_path else None
+            if delta:
+                turn, diff = delta
+                if diff is None:
+                    wrapped_content = f'Path: `{file_path}` (unchanged since it was sent in turn {turn})'
+                else:
+                    wrapped_content = (
+                        f'Path: `{file_path}` (changes since it was sent in turn {turn})\n\n'
+                        f'```diff\n{diff}```'
+                    )
+                items.append(SublimeInputContent(InputKind.Sheet, wrapped_content, file_path, scope_name))
+            elif packed.mode == PackedSheet.FULL:
+                # An unchanged sheet reuses the item wrapped for the previous request
+                snapshot = sheet_snapshot(view)
+                if snapshot.item is None or snapshot.item_key != (file_path, scope_name):
+                    content = BufferContentManager.wrap_content_with_scope(scope_name, packed.content)
+                    wrapped_content = f'Path: `{file_path}`\n\n' + content
+                    snapshot.item = SublimeInputContent(
+                        InputKind.Sheet, wrapped_content, file_path, scope_name
+                    )
+                    snapshot.item_key = (file_path, scope_name)
+                items.append(snapshot.item)
+            else:
+                content = BufferContentManager.wrap_content_with_scope(scope_name, packed.content)
+                lines_count = len(packed.source.lines)
+                wrapped_content = (
+                    f'Path: `{file_path}` ({packed.mode} of {lines_count} lines, '
+                    'the omitted lines can be read with read_region_content)\n\n' + content
+                )
+                items.append(SublimeInputContent(InputKind.Sheet, wrapped_content, file_path, scope_name))
 
-                scope_region = view.scope_name(0)  # Assuming you want the scope at the start of the document
-                scope_name = scope_region.split(' ')[0].split('.')[-1]
+        return items
 
-                file_path = view.file_name()
-                content = view.substr(Region(0, view.size()))
-                content = BufferContentManager.wrap_content_with_scope(scope_name, content)
+    @staticmethod
+    def pack_sheets(sheets: List[Sheet], token_budget: int = 0) -> List[Tuple[View, PackedSheet]]:
+        """Fits the content of `sheets` into `token_budget` tokens, keeping the selected
+        and recently edited lines"""
+        views: List[View] = []
+        for sheet in sheets:
+            view = sheet.view()
+            if not view:
+                continue  # If for some reason the sheet cannot be converted to a view, skip.
+            views.append(view)
+
+        if token_budget <= 0:
+            # Packing is off, the sheets are sent whole and neither their outline nor focus rows are needed
+            sources = [
+                SheetSource(BufferContentManager.sheet_name(view), sheet_snapshot(view).text)
+                for view in views
+            ]
+        else:
+            sources = [BufferContentManager.sheet_source(view) for view in views]
+        return list(zip(views, pack_sheets(sources, token_budget)))
 
-                wrapped_content = f'Path: `{file_path}`\n\n' + content
-                items.append(SublimeInputContent(InputKind.Sheet, wrapped_content, file_path, scope_name))
+    @staticmethod
+    def sheet_source(view: View) -> SheetSource:
+        focus_rows = recent_edits(view.id())
+        for region in view.sel():
+            if not region.empty():
+                focus_rows.extend(range(view.rowcol(region.begin())[0], view.rowcol(region.end())[0] + 1))
 
-        return items
+        snapshot = sheet_snapshot(view)
+        name = BufferContentManager.sheet_name(view)
+        return SheetSource(name, snapshot.text, focus_rows, snapshot.outline_rows, snapshot.lines)
+
+    @staticmethod
+    def sheet_name(view: View) -> str:
+        name = view.name()
+        if not name:
+            file_name = view.file_name()
+            name = os.path.basename(file_name) if file_name else '<untitled>'
+        return name
+
+
+class SheetSnapshot:
+    """Content of a view as of its `change_count`, reused by the requests until the view changes.
+
+    Its lines and symbol rows are only worked out once a sheet has to be trimmed to fit the budget.
+    """
+
+    __slots__ = ('view', 'change_count', 'text', '_lines', '_outline_rows', 'item', 'item_key')
+
+    def __init__(self, view: View, change_count: int, text: str) -> None:
+        self.view = view
+        self.change_count = change_count
+        self.text = text
+        self._lines: List[str] | None = None
+        self._outline_rows: List[int] | None = None
+        self.item: SublimeInputContent | None = None  # the whole sheet wrapped, for (file path, scope)
+        self.item_key: Tuple[str | None, str] | None = None
+
+    @property
+    def lines(self) -> List[str]:
+        if self._lines is None:
+            self._lines = self.text.split('\n')
+        return self._lines
+
+    @property
+    def outline_rows(self) -> List[int]:
+        if self._outline_rows is None:
+            if self.view.change_count() != self.change_count:
+                return []  # the symbols no longer match the text, a fresh snapshot will have them
+            view = self.view
+            self._outline_rows = [view.rowcol(symbol.region.begin())[0] for symbol in view.symbol_regions()]
+        return self._outline_rows
+
+
+_snapshots: Dict[int, SheetSnapshot] = {}
+
+
+def sheet_snapshot(view: View) -> SheetSnapshot:
+    change_count = view.change_count()
+    snapshot = _snapshots.get(view.id())
+    if snapshot is None or snapshot.change_count != change_count:
+        snapshot = SheetSnapshot(view, change_count, view.substr(Region(0, view.size())))
+        _snapshots[view.id()] = snapshot
+    return snapshot
+
+
+def forget_snapshot(view_id: int):
+    _snapshots.pop(view_id, None)
 
 
 class TextStreamAtCommand(TextCommand):
@@ -70,6 +188,13 @@ class ReplaceRegionCommand(TextCommand):
         self.view.replace(edit=edit, region=Region(region['a'], region['b']), text=text)
 
 
+class ReplaceRegionsCommand(TextCommand):
+    def run(self, edit: Edit, edits: List[Tuple[Point, Point, str]]):  # type: ignore
+        # Back to front, so the offsets of the edits yet to apply stay valid
+        for begin, end, text in sorted(edits, key=lambda item: item[0], reverse=True):
+            self.view.replace(edit=edit, region=Region(begin, end), text=text)
+
+
 class EraseRegionCommand(TextCommand):
     def run(self, edit: Edit, region: Dict[str, Point]):  # type: ignore
         self.view.erase(edit=edit, region=Region(region['a'], region['b']))
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Deque, Dict, Iterable, List
+
+CHARS_PER_TOKEN = 4  # rough average for code and English prose
+CONTEXT_LINES = 30  # lines kept around each focus line in an excerpt
+RECENT_EDITS = 8  # edited rows remembered per view
+
+
+class SheetSource:
+    """Content of a marked sheet along with the lines worth keeping when it has to be trimmed."""
+
+    def __init__(
+        self,
+        name: str,
+        text: str,
+        focus_rows: Iterable[int] = (),
+        outline_rows: Iterable[int] = (),
+        lines: List[str] | None = None,
+    ) -> None:
+        self.name = name
+        self.text = text
+        self._lines = lines
+        # Rows of the selection and recent edits, and of the symbol definitions
+        self.focus_rows = sorted({row for row in focus_rows if 0 <= row < len(self.lines)})
+        self.outline_rows = sorted({row for row in outline_rows if 0 <= row < len(self.lines)})
+
+    @property
+    def lines(self) -> List[str]:
+        """Split only once the sheet has to be trimmed"""
+        if self._lines is None:
+            self._lines = self.text.split('\n')
+        return self._lines
+
+
+class PackedSheet:
+    FULL = 'full'
+    EXCERPT = 'excerpt'
+    OUTLINE = 'outline'
+    OMITTED = 'omitted'
+
+    def __init__(self, source: SheetSource, mode: str, content: str) -> None:
+        self.source = source
+        self.mode = mode
+        self.content = content
+        self.tokens = estimate_tokens(content)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def pack_sheets(sources: List[SheetSource], budget: int) -> List[PackedSheet]:
+    """Fits the sheets into `budget` tokens, `budget <= 0` means no limit.
+
+    Every sheet starts as its outline (or omitted if even the outlines don't fit), then sheets
+    with focus lines first, and the rest in their original order, are upgraded to the full content
+    if it still fits, or to an excerpt around their focus lines (or their head) otherwise.
+    """
+    full = [PackedSheet(source, PackedSheet.FULL, source.text) for source in sources]
+    if budget <= 0 or sum(sheet.tokens for sheet in full) <= budget:
+        return full
+
+    order = sorted(range(len(sources)), key=lambda i: not sources[i].focus_rows)
+    packed = [_outline(source) for source in sources]
+    used = sum(sheet.tokens for sheet in packed)
+    for i in reversed(order):
+        if used <= budget:
+            break
+        omitted = PackedSheet(sources[i], PackedSheet.OMITTED, _render(sources[i].lines, []))
+        used += omitted.tokens - packed[i].tokens
+        packed[i] = omitted
+
+    for i in order:
+        candidates = [full[i], _excerpt(sources[i])]
+        for candidate in candidates:
+            if candidate.tokens > packed[i].tokens and used + candidate.tokens - packed[i].tokens <= budget:
+                used += candidate.tokens - packed[i].tokens
+                packed[i] = candidate
+                break
+    return packed
+
+
+def _outline(source: SheetSource) -> PackedSheet:
+    return PackedSheet(source, PackedSheet.OUTLINE, _render(source.lines, source.outline_rows))
+
+
+def _excerpt(source: SheetSource) -> PackedSheet:
+    rows = set(source.outline_rows)
+    for focus in source.focus_rows or [0]:
+        rows.update(range(max(0, focus - CONTEXT_LINES), min(len(source.lines), focus + CONTEXT_LINES + 1)))
+    return PackedSheet(source, PackedSheet.EXCERPT, _render(source.lines, sorted(rows)))
+
+
+def _render(lines: List[str], rows: List[int]) -> str:
+    """Keeps only `rows` of `lines`, gaps are replaced by markers with their (0-based) line range."""
+    result: List[str] = []
+    previous = -1
+    for row in rows:
+        if row > previous + 1:
+            result.append(_gap(previous + 1, row - 1))
+        result.append(lines[row])
+        previous = row
+    if previous < len(lines) - 1:
+        result.append(_gap(previous + 1, len(lines) - 1))
+    return '\n'.join(result)
+
+
+def _gap(first: int, last: int) -> str:
+    return f'… lines {first}-{last} …'
+
+
+_recent_edits: Dict[int, Deque[int]] = {}
+
+
+def record_edit(view_id: int, row: int):
+    rows = _recent_edits.get(view_id)
+    if rows is None:
+        rows = _recent_edits[view_id] = deque(maxlen=RECENT_EDITS)
+    if not rows or rows[-1] != row:
+        rows.append(row)
+
+
+def recent_edits(view_id: int) -> List[int]:
+    return list(_recent_edits.get(view_id, ()))
+
+
+def forget_edits(view_id: int):
+    _recent_edits.pop(view_id, None)
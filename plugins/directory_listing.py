@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from fnmatch import fnmatch
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_PAGE_LIMIT = 1000  # entries
+MAX_PAGE_CHARS = 5000
+MAX_CURSORS = 16
+
+Walker = Callable[[str, Optional[int]], Iterator[Tuple[str, List[str], List[str]]]]
+Entry = Tuple[str, Optional[str]]  # (directory header, name), name is None for an empty directory
+
+
+def listing_entries(
+    walk: Iterator[Tuple[str, List[str], List[str]]], base: str, pattern: str | None
+) -> Iterator[Entry]:
+    """Lazily flattens the walk into `ls -R` entries, filtered by a glob `pattern`."""
+    for root, dirs, files in walk:
+        rel = os.path.relpath(root, base)
+        if rel == '.':
+            # Top-level directory: use "." as ls -R does
+            header, names = '.:', sorted(dirs + files)
+        else:
+            header, names = f'./{rel}:', dirs + files
+
+        if pattern:
+            names = [name for name in names if _matches(pattern, rel, name)]
+            if not names:
+                continue
+        if not names:
+            yield header, None
+        for name in names:
+            yield header, name
+
+
+def _matches(pattern: str, rel: str, name: str) -> bool:
+    if '/' in pattern:
+        path = os.path.normpath(os.path.join(rel, name))
+        return any(fnmatch(path, variant) for variant in _pattern_variants(pattern))
+    return fnmatch(name, pattern)
+
+
+@lru_cache(maxsize=64)
+def _pattern_variants(pattern: str) -> Tuple[str, ...]:
+    """`pattern` along with its `**/` parts matching no directory at all, as `**/*.py` does for `a.py`"""
+    variants = [pattern]
+    parts = pattern.split('**/')
+    for skipped in range(1, 2 ** (len(parts) - 1)):
+        variant = parts[0]
+        for i, part in enumerate(parts[1:]):
+            variant += part if skipped >> i & 1 else '**/' + part
+        variants.append(variant)
+    return tuple(variants)
+
+
+class ListingCursor:
+    """A paused traversal, so the next page continues the walk instead of starting it over."""
+
+    def __init__(self, key: Tuple[Any, ...], entries: Iterator[Entry]) -> None:
+        self.id = uuid.uuid4().hex[:8]
+        self.key = key
+        self.entries = entries
+        self.offset = 0
+        self.lookahead: Entry | None = None
+
+    def next(self) -> Entry | None:
+        if self.lookahead is not None:
+            entry, self.lookahead = self.lookahead, None
+        else:
+            entry = next(self.entries, None)
+        if entry is not None:
+            self.offset += 1
+        return entry
+
+    def push_back(self, entry: Entry):
+        self.lookahead = entry
+        self.offset -= 1
+
+    def skip(self, count: int):
+        while self.offset < count and self.next() is not None:
+            pass
+
+    def has_more(self) -> bool:
+        entry = self.next()
+        if entry is None:
+            return False
+        self.push_back(entry)
+        return True
+
+
+_cursors: 'OrderedDict[str, ListingCursor]' = OrderedDict()
+_cursors_lock = threading.Lock()
+
+
+def list_directory(
+    path: str,
+    walk: Walker,
+    depth: int | None = None,
+    pattern: str | None = None,
+    offset: int = 0,
+    limit: int = DEFAULT_PAGE_LIMIT,
+    continuation_token: str | None = None,
+) -> Dict[str, Any]:
+    """Returns a single page of the `ls -R`-like listing of `path`.
+
+    The traversal stops as soon as the page is filled (by `limit` entries or `MAX_PAGE_CHARS`)
+    and is kept paused under the returned `continuation_token` to serve the next page.
+    """
+    key = (path, depth, pattern)
+    cursor = None
+    if continuation_token:
+        cursor_id, _, token_offset = continuation_token.partition(':')
+        offset = int(token_offset) if token_offset.isdigit() else offset
+        with _cursors_lock:  # taken out, so no other call can advance the same cursor
+            cursor = _cursors.pop(cursor_id, None)
+    if cursor is None or cursor.key != key or cursor.offset != offset:
+        cursor = ListingCursor(key, listing_entries(walk(path, depth), path, pattern))
+        cursor.skip(offset)
+
+    lines: List[str] = []
+    header: str | None = None
+    names: List[str] = []
+    size = 0
+    returned = 0
+    while returned < limit:
+        entry = cursor.next()
+        if entry is None:
+            break
+        entry_header, name = entry
+        entry_size = len(name or '') + 1 + (len(entry_header) + 2 if entry_header != header else 0)
+        if returned and size + entry_size > MAX_PAGE_CHARS:
+            cursor.push_back(entry)
+            break
+        if entry_header != header:
+            _flush_section(lines, header, names)
+            header, names = entry_header, []
+        if name is not None:
+            names.append(name)
+        size += entry_size
+        returned += 1
+    _flush_section(lines, header, names)
+
+    result: Dict[str, Any] = {'content': '\n'.join(lines).rstrip('\n'), 'offset': offset, 'entries': returned}
+    if cursor.has_more():
+        token = f'{cursor.id}:{cursor.offset}'
+        with _cursors_lock:
+            _cursors[cursor.id] = cursor
+            while len(_cursors) > MAX_CURSORS:
+                _cursors.popitem(last=False)
+        result['continuation_token'] = token
+        result['content'] += (
+            f'\n…[page truncated] call again with the same arguments and "continuation_token": "{token}"'
+        )
+    return result
+
+
+def _flush_section(lines: List[str], header: str | None, names: List[str]):
+    if header is None:
+        return
+    lines.append(header)
+    if names:
+        lines.append(' '.join(names))
+    lines.append('')
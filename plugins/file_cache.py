@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET_MB = 64
+ENTRY_SHARE = 8  # files over budget / ENTRY_SHARE bytes aren't cached, but read lazily by their callers
+
+Key = Tuple[str, int, int]  # (path, mtime_ns, size)
+
+
+class CachedFile:
+    """Decoded content of a file along with the offsets of its line starts.
+
+    Line breaks are normalized the way `file_reader.LineIndex` does it: `\\r\\n` becomes `\\n`
+    and a lone `\\r` is kept, so a cached read and a lazy one give the same text.
+    """
+
+    __slots__ = ('text', 'line_starts', 'memory')
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        # line_starts[i] is where line i starts, as Sublime counts lines
+        lengths = (len(line) + 1 for line in text.split('\n')[:-1])
+        self.line_starts = array('Q', accumulate(lengths, initial=0))
+        self.memory = sys.getsizeof(text) + self.line_starts.itemsize * len(self.line_starts)
+
+    def lines(self, first: int, last: int | None = None) -> str:
+        """Returns lines `first..last` (inclusive, clamped to the file) joined by `\\n`,
+        `last=None` is up to the end."""
+        total = len(self.line_starts)
+        last = total - 1 if last is None else min(last, total - 1)
+        first = max(0, min(first, total))
+        if first > last:
+            return ''
+        end = self.line_starts[last + 1] - 1 if last + 1 < total else len(self.text)
+        text = self.text[self.line_starts[first] : end]
+        return text[:-1] if text.endswith('\r') else text
+
+
+class FileCache:
+    """LRU cache of text files shared by the tool handlers, bounded by `budget` bytes.
+
+    Entries are keyed by path, mtime and size, so a file changed on disk is never served stale.
+    Files over `budget / ENTRY_SHARE` bytes or not valid UTF-8 aren't cached, `get` returns None for them
+    without reading them.
+    """
+
+    def __init__(self, budget: int = DEFAULT_BUDGET_MB * 1024 * 1024) -> None:
+        self.budget = budget
+        self.memory: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._entries: 'OrderedDict[str, Tuple[Key, CachedFile]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> CachedFile | None:
+        """Returns the current content of `path`, reading it on a miss. Raises OSError if it can't be read."""
+        key = _key(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == key:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        if key[2] > self.max_entry_size:
+            return None
+        with open(path, 'rb') as file:
+            data = file.read()
+        try:
+            text = data.decode('utf-8').replace('\r\n', '\n')
+        except UnicodeDecodeError:
+            return None
+        cached = CachedFile(text)
+        self._store(path, key, cached)
+        return cached
+
+    def put(self, path: str, text: str):
+        """Caches the content just written to `path`, so the next read is a hit."""
+        try:
+            key = _key(path)
+        except OSError:
+            return
+        if key[2] > self.max_entry_size:
+            self._drop(path)
+            return
+        self._store(path, key, CachedFile(text.replace('\r\n', '\n')))
+
+    @property
+    def max_entry_size(self) -> int:
+        return self.budget // ENTRY_SHARE
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'memory': self.memory,
+        }
+
+    def _drop(self, path: str):
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous:
+                self.memory -= previous[1].memory
+
+    def _store(self, path: str, key: Key, cached: CachedFile):
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous:
+                self.memory -= previous[1].memory
+            if cached.memory > self.budget:
+                return
+            self._entries[path] = (key, cached)
+            self.memory += cached.memory
+            while self.memory > self.budget:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.memory -= evicted.memory
+                self.evictions += 1
+        logger.debug('file cache: %s', self.stats())
+
+
+def _key(path: str) -> Key:
+    stat = os.stat(path)
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+file_cache = FileCache()
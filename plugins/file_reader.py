@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import mmap
+import os
+from array import array
+from itertools import accumulate
+from typing import Union
+
+MMAP_THRESHOLD = 1 << 20  # bytes, smaller files are read whole
+SCAN_CHUNK = 1 << 22  # bytes
+
+Buffer = Union[bytes, mmap.mmap]
+
+
+class LineIndex:
+    """Byte offsets of the line starts of a file on disk.
+
+    The file is scanned lazily only as far as the furthest requested line, so reading
+    the head of a huge file doesn't touch the rest of it. Files above `MMAP_THRESHOLD`
+    are memory-mapped instead of being read into memory.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.offsets = array('Q', [0])  # offsets[i] is where line i starts, as Sublime counts lines
+        self.scanned = 0  # bytes
+        self.complete = self.size == 0
+
+    def read(self, first: int, last: int | None = None) -> str:
+        """Returns lines `first..last` (inclusive, clamped to the file) joined by `\\n`,
+        `last=None` is up to the end."""
+        with open(self.path, 'rb') as file:
+            if self.size >= MMAP_THRESHOLD:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return self._read(data, first, last)
+            return self._read(file.read(), first, last)
+
+    def _read(self, data: Buffer, first: int, last: int | None) -> str:
+        self._extend(data, None if last is None else last + 1)
+        total = len(self.offsets)
+        last = total - 1 if last is None else min(last, total - 1)
+        first = max(0, min(first, total))
+        if first > last:
+            return ''
+
+        begin = self.offsets[first]
+        end = self.offsets[last + 1] - 1 if last + 1 < total else self.size  # without the line break
+        text = data[begin:end].decode('utf-8', errors='replace').replace('\r\n', '\n')
+        return text[:-1] if text.endswith('\r') else text
+
+    def _extend(self, data: Buffer, line: int | None):
+        """Scans the file until the start of `line` is known, or to the end if `line` is None."""
+        offsets = self.offsets
+        while not self.complete and (line is None or len(offsets) <= line):
+            # Chunks grow with the scanned part, so reading the head of a file stays cheap
+            chunk_size = min(SCAN_CHUNK, max(1 << 16, self.scanned))
+            chunk = data[self.scanned : self.scanned + chunk_size]
+            # Splitting the whole chunk at once is much faster than looking for line breaks one by one
+            lengths = (len(part) + 1 for part in chunk.split(b'\n')[:-1])
+            starts = list(accumulate(lengths, initial=self.scanned))[1:]
+            if line is not None and len(offsets) + len(starts) > line + 1:
+                del starts[line + 1 - len(offsets) :]
+                self.scanned = starts[-1]
+            else:
+                self.scanned += len(chunk)
+            offsets.extend(starts)
+            self.complete = self.scanned >= self.size
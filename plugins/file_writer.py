@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+from difflib import SequenceMatcher
+from typing import List, Tuple
+
+from sublime import Region, Window
+
+from .file_cache import file_cache
+
+logger = logging.getLogger(__name__)
+
+TextEdit = Tuple[int, int, str]  # [begin, end) offsets in the old text and the text to put there
+
+
+def read_text(window: Window, path: str) -> str:
+    """Returns the content of an open (maybe unsaved) view of `path`, or of the file on disk."""
+    view = window.find_open_file(path)
+    if view and not view.is_loading():
+        return view.substr(Region(0, view.size()))
+    cached = file_cache.get(path)
+    if cached:
+        return cached.text
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        return file.read().replace('\r\n', '\n')  # the same text as a cached read
+
+
+def write_text(window: Window, path: str, old: str, new: str):
+    """Changes `path` from `old` to `new` content.
+
+    An open view gets only the changed lines replaced in place, as a single undo step,
+    and is saved afterwards unless it already had unsaved changes.
+    Otherwise the file is replaced atomically on disk.
+    """
+    view = window.find_open_file(path)
+    if view and not view.is_loading():
+        edits = minimal_edits(old, new)
+        if not edits:
+            return
+        was_dirty = view.is_dirty()
+        view.run_command('replace_regions', {'edits': [[begin, end, text] for begin, end, text in edits]})
+        if not was_dirty:
+            view.run_command('save')
+        logger.debug('patched %s in place with %d edits', path, len(edits))
+        return
+    write_atomic(path, new)
+
+
+def minimal_edits(old: str, new: str) -> List[TextEdit]:
+    """Returns line-level edits turning `old` into `new`, in ascending order."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+
+    # The common head and tail are cheap to skip and usually cover almost the whole file
+    head = 0
+    limit = min(len(old_lines), len(new_lines))
+    while head < limit and old_lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old_lines[-1 - tail] == new_lines[-1 - tail]:
+        tail += 1
+
+    offsets = [0]
+    for line in old_lines:
+        offsets.append(offsets[-1] + len(line))
+
+    old_middle = old_lines[head : len(old_lines) - tail]
+    new_middle = new_lines[head : len(new_lines) - tail]
+    edits: List[TextEdit] = []
+    matcher = SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        edits.append((offsets[head + i1], offsets[head + i2], ''.join(new_middle[j1:j2])))
+    return edits
+
+
+def write_atomic(path: str, content: str):
+    """Writes `content` to a temporary file next to `path` and renames it over `path`.
+
+    Symlinks are written through to their target. A new file, or one with other hard links
+    that a rename would detach, is written in place instead.
+    """
+    target = os.path.realpath(path)
+    try:
+        stat = os.stat(target)
+    except FileNotFoundError:
+        stat = None
+    if stat is None or stat.st_nlink > 1:
+        with open(target, 'w', encoding='utf-8') as file:
+            file.write(content)
+        file_cache.put(path, content)
+        return
+
+    directory = os.path.dirname(target)
+    descriptor, temp_path = tempfile.mkstemp(prefix='.' + os.path.basename(target) + '.', dir=directory)
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            file.write(content)
+        os.chmod(temp_path, stat.st_mode & 0o7777)  # mkstemp creates files readable by the owner only
+        os.replace(temp_path, target)
+        file_cache.put(path, content)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
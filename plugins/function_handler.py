@@ -2,16 +2,26 @@ from __future__ import annotations
 
 import logging
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from json import dumps, loads
 from typing import Dict, List, Tuple
 
-from sublime import Region, Window
+from sublime import Region, View, Window
 
-from .project_structure import get_ignored_files
+from .directory_listing import DEFAULT_PAGE_LIMIT, list_directory
+from .file_cache import file_cache
+from .file_reader import LineIndex
+from .file_writer import read_text, write_atomic, write_text
+from .hunk_matcher import apply_hunks, apply_hunks_fuzzy
+from .project_index import find_project_index
+from .project_structure import ignore_checker
 
 logger = logging.getLogger(__name__)
 
+HUNK_HEADER = re.compile(r'^@@ -(\d+)')
+
 
 class Function(str, Enum):
     apply_patch = 'apply_patch'
@@ -126,42 +136,7 @@ def _apply_hunks_sequentially(original: str, hunks: List[Tuple[str, str]]) -> st
     Replace the first matching occurrence of each old block in the file.
     Raises RuntimeError if a hunk cannot be located.
     """
-    # Split original text into lines with endings
-    orig_lines = original.splitlines(keepends=True)
-
-    for idx, (old, new) in enumerate(hunks, start=1):
-        # Old/new blocks as lists of lines (with endings)
-        old_lines = old.splitlines(keepends=True)
-        new_lines = new.splitlines(keepends=True) if new else []
-
-        # If old block is empty, append new lines at EOF
-        if not old_lines or (len(old_lines) == 1 and old_lines[0] == '\n'):
-            orig_lines.extend(new_lines)
-            continue
-
-        # Search for first position where stripped lines match
-        found = False
-        for i in range(len(orig_lines) - len(old_lines) + 1):
-            match = True
-            for j, old_line in enumerate(old_lines):
-                # Compare ignoring leading whitespace
-                if orig_lines[i + j].lstrip() != old_line.lstrip():
-                    match = False
-                    break
-            if match:
-                # Replace these lines
-                orig_lines = orig_lines[:i] + new_lines + orig_lines[i + len(old_lines) :]
-                found = True
-                break
-
-        if not found:
-            snippet = old_lines[0].lstrip() or '<newline>'
-            raise RuntimeError(
-                f'Hunk {idx}: context not found – failed to locate "{snippet.strip()}..." in target file'
-            )
-
-    # Reconstruct updated text
-    return ''.join(orig_lines)
+    return apply_hunks(original, hunks)
 
 
 # ---------------------------------------------------------------------------
@@ -198,6 +173,171 @@ def _parse_simple_patch(diff: str) -> List[Tuple[str, str]]:
     return hunks
 
 
+def _parse_hunk_hints(diff: str) -> List[int | None]:
+    """Returns the original line number from the `@@ -N,M +N,M @@` header preceding each hunk
+    found by `_parse_simple_patch`, or None for hunks without one."""
+    lines = diff.splitlines()
+    i = 0
+    hint: int | None = None
+    hints: List[int | None] = []
+
+    while i < len(lines):
+        header = HUNK_HEADER.match(lines[i])
+        if header:
+            hint = int(header.group(1))
+            i += 1
+        elif lines[i].startswith('-') and not lines[i].startswith('---'):
+            while i < len(lines) and lines[i].startswith('-') and not lines[i].startswith('---'):
+                i += 1
+            while i < len(lines) and lines[i].startswith('+') and not lines[i].startswith('+++'):
+                i += 1
+            hints.append(hint)
+            hint = None
+        else:
+            i += 1
+
+    return hints
+
+
+MAX_PATCH_WORKERS = 8
+
+
+class PatchError(Exception):
+    """A patched file can't be read or its hunks can't be applied, the message is returned to the model."""
+
+
+def _patch_file(window: Window, path: str, diffs: List[str]) -> Tuple[str, str, str, str | None]:
+    """Applies all the `diffs` of a file in memory.
+
+    Returns (path, original, new content, note about approximately located hunks).
+    Raises PatchError if the file can't be read or any of the diffs can't be applied.
+    """
+    # ---------------------------------------------------------------
+    # 1) Read original file content (fail early if file absent)
+    # ---------------------------------------------------------------
+    try:
+        original = read_text(window, path)
+    except FileNotFoundError:
+        raise PatchError(f'File not found: {path}')
+    except Exception as e:
+        raise PatchError(f'Unable to read {path}: {e}')
+
+    content = original
+    approximate: List[str] = []
+    for normalized_diff in diffs:
+        # ---------------------------------------------------------------
+        # 2) Parse & apply with strict model-style diff first
+        # ---------------------------------------------------------------
+        new_content: str | None = None
+        strict_err: Exception | None = None
+
+        try:
+            hunks = _parse_model_patch(normalized_diff)
+            new_content = _apply_hunks_sequentially(content, hunks)
+        except Exception as e:
+            strict_err = e
+
+        # Already-applied shortcut
+        if strict_err:
+            try:
+                simple_hunks = _parse_simple_patch(normalized_diff)
+                applied_all = True
+                for old_hunk, new_hunk in simple_hunks:
+                    old_str = old_hunk.strip('\n')
+                    new_str = new_hunk.strip('\n')
+
+                    if not new_str:
+                        continue  # pure deletion, ignore
+
+                    # New part is present and old part is gone?
+                    if new_str in content and (not old_str or old_str not in content):
+                        continue
+
+                    applied_all = False
+                    break
+
+                if applied_all:
+                    continue  # block already applied, skip it
+            except Exception:
+                pass
+
+        if new_content is None:
+            try:
+                hunks = _parse_simple_patch(normalized_diff)
+                if not hunks:
+                    raise PatchError(
+                        'Patch parse failed – no hunks detected.\n'
+                        'Ensure each change block starts with one or more "-" lines\n'
+                        'and the patch is wrapped between *** Begin Patch / *** End Patch.'
+                    )
+                new_content, confidences = apply_hunks_fuzzy(
+                    content, hunks, _parse_hunk_hints(normalized_diff)
+                )
+                approximate.extend(
+                    f'hunk {idx} with confidence {confidence:.2f}'
+                    for idx, confidence in enumerate(confidences, start=1)
+                    if confidence < 1.0
+                )
+            except PatchError:
+                raise
+            except Exception as legacy_err:
+                raise PatchError(
+                    f'Strict parser error: {strict_err}.\nFallback parser also failed: {legacy_err}'
+                )
+
+        content = new_content
+
+    note = f'{path}: located approximately {", ".join(approximate)}' if approximate else None
+    return path, original, content, note
+
+
+def _rollback(window: Window, written: List[Tuple[str, str, str]]) -> str:
+    """Restores the files written so far, returns a report for the model."""
+    failed: List[str] = []
+    for path, original, new_content in reversed(written):
+        try:
+            write_text(window, path, new_content, original)
+        except Exception as e:
+            failed.append(f'{path}: {e}')
+    if failed:
+        return 'Failed to roll back the already written files:\n' + '\n'.join(failed)
+    return 'No file was changed, the patch was rolled back.'
+
+
+def _read_view_lines(view: View, first: int, last: int | None = None) -> str:
+    """Same as `LineIndex.read`, but for the (maybe unsaved) content of an open view."""
+    total = view.rowcol(view.size())[0] + 1
+    last = total - 1 if last is None else min(last, total - 1)
+    first = max(0, min(first, total))
+    if first > last:
+        return ''
+    begin = view.text_point(first, 0)
+    end = view.line(view.text_point(last, 0)).end()
+    return view.substr(Region(begin, end))
+
+
+def touched_paths(func_name: str, args: str, window: Window) -> List[str]:
+    """Returns the absolute paths of the files a tool call reads or writes, empty if unknown."""
+    try:
+        args_json = loads(args)
+        if func_name == Function.apply_patch.value:
+            paths = [path for _, path in _extract_patch_blocks(args_json.get('patch') or '')]
+        elif func_name in (Function.replace_text_for_whole_file.value, Function.read_region_content.value):
+            paths = [args_json.get('file_path')]
+        else:
+            return []
+    except Exception:
+        return []
+
+    folders = window.folders()
+    project_root = folders[0] if folders else os.getcwd()
+    return [
+        os.path.normpath(path if os.path.isabs(path) else os.path.join(project_root, path))
+        for path in paths
+        if isinstance(path, str)
+    ]
+
+
 class FunctionHandler:
     @staticmethod
     def perform_function(func_name: str, args: str, window: Window) -> str:
@@ -223,89 +363,39 @@ class FunctionHandler:
                     f'Parsing error: {e}'
                 )
 
+            # Blocks of the same file are applied one after another, in the patch order
+            targets: Dict[str, List[str]] = {}
             for normalized_diff, path in blocks:
                 # If path is not absolute, treat it as relative to project root
                 if not os.path.isabs(path):
                     folders = window.folders()
                     project_root = folders[0] if folders else os.getcwd()
                     path = os.path.join(project_root, path)
+                targets.setdefault(path, []).append(normalized_diff)
 
-                # ---------------------------------------------------------------
-                # 1) Read original file content (fail early if file absent)
-                # ---------------------------------------------------------------
-                try:
-                    with open(path, 'r', encoding='utf-8') as f:
-                        original = f.read()
-                except FileNotFoundError:
-                    return f'File not found: {path}'
-                except Exception as e:
-                    return f'Unable to read {path}: {e}'
-
-                # ---------------------------------------------------------------
-                # 2) Parse & apply with strict model-style diff first
-                # ---------------------------------------------------------------
-                new_content: str | None = None
-                strict_err: Exception | None = None
-
+            # 1) Read and patch every file in memory, nothing is written unless all of them apply
+            workers = max(1, min(MAX_PATCH_WORKERS, len(targets)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='apply_patch') as executor:
                 try:
-                    hunks = _parse_model_patch(normalized_diff)
-                    new_content = _apply_hunks_sequentially(original, hunks)
-                except Exception as e:
-                    strict_err = e
-
-                # Already-applied shortcut
-                if strict_err:
-                    try:
-                        simple_hunks = _parse_simple_patch(normalized_diff)
-                        applied_all = True
-                        for old_hunk, new_hunk in simple_hunks:
-                            old_str = old_hunk.strip('\n')
-                            new_str = new_hunk.strip('\n')
+                    patches = list(executor.map(lambda target: _patch_file(window, *target), targets.items()))
+                except PatchError as e:
+                    return str(e)
 
-                            if not new_str:
-                                continue  # pure deletion, ignore
-
-                            # New part is present and old part is gone?
-                            if new_str in original and (not old_str or old_str not in original):
-                                continue
-
-                            applied_all = False
-                            break
-
-                        if applied_all:
-                            continue  # block already applied, skip write
-                    except Exception:
-                        pass
-
-                if new_content is None:
-                    try:
-                        hunks = _parse_simple_patch(normalized_diff)
-                        if not hunks:
-                            return (
-                                'Patch parse failed – no hunks detected.\n'
-                                'Ensure each change block starts with one or more "-" lines\n'
-                                'and the patch is wrapped between *** Begin Patch / *** End Patch.'
-                            )
-                        new_content = _apply_hunks_sequentially(original, hunks)
-                    except Exception as legacy_err:
-                        return (
-                            f'Strict parser error: {strict_err}.\nFallback parser also failed: {legacy_err}'
-                        )
-
-                # 3) Check no change
+            # 2) Commit the writes, restoring the already written files if any of them fails
+            written: List[Tuple[str, str, str]] = []
+            for path, original, new_content, _ in patches:
                 if new_content == original:
                     continue  # nothing changed for this file
-
-                # 4) Write back
                 try:
-                    with open(path, 'w', encoding='utf-8') as f:
-                        f.write(new_content)
+                    write_text(window, path, original, new_content)
                 except PermissionError as e:
-                    return f'Permission denied when writing to {path}: {e}'
+                    return f'Permission denied when writing to {path}: {e}\n' + _rollback(window, written)
                 except Exception as e:
-                    return f'Failed to write changes to {path}: {e}'
+                    return f'Failed to write changes to {path}: {e}\n' + _rollback(window, written)
+                written.append((path, original, new_content))
 
-            return 'Done!'
+            notes = [note for *_, note in patches if note]
+            return 'Done!' + ''.join(f'\n{note}' for note in notes)
 
         # -------------------------------------------------------------------
         # replace_text_for_whole_file – simple file write
@@ -331,10 +421,12 @@ class FunctionHandler:
                     except Exception as e:
                         return f'Failed to create directory: {e}'
 
-            # Write file to disk
+            # Write file to disk, or into its open view
             try:
-                with open(path, 'w', encoding='utf-8') as f:
-                    f.write(content)
+                if window.find_open_file(path):
+                    write_text(window, path, read_text(window, path), content)
+                else:
+                    write_atomic(path, content)
             except Exception as e:
                 return f'Failed to write file: {e}'
 
@@ -352,34 +444,24 @@ class FunctionHandler:
                 project_root = folders[0] if folders else os.getcwd()
                 path = os.path.join(project_root, path)
 
-            # Open or find the view
-            view = window.find_open_file(path) or window.open_file(path)
-            if not view:
-                return f'File under path not found: {path}'
-
             # Determine line indices (0-based; -1 means start/end)
             a_val = region.get('a')
-            a_line = a_val if isinstance(a_val, int) and a_val != -1 else 0
-
-            all_lines = view.lines(Region(0, view.size()))
-            total = len(all_lines)
-
+            a_line = max(0, a_val) if isinstance(a_val, int) and a_val != -1 else 0
             b_val = region.get('b')
-            b_line = b_val if isinstance(b_val, int) and b_val != -1 else total
-
-            # Clamp to valid range, inclusive upper bound
-            a_line = max(0, min(a_line, total))
-            b_line = max(0, min(b_line, total - 1))
-
-            if a_line > b_line:
-                return dumps({'content': ''})
+            b_line = max(0, b_val) if isinstance(b_val, int) and b_val != -1 else None
 
-            # Slice is exclusive on end, so include b_line
-            selected = all_lines[a_line : b_line + 1]
-
-            # Join line contents with newline separators
-            lines = [view.substr(r) for r in selected]
-            text = '\n'.join(lines)
+            # Unsaved changes are only in the view, anything else is read from disk without opening a tab
+            view = window.find_open_file(path)
+            if view and (view.is_dirty() or not os.path.isfile(path)):
+                text = _read_view_lines(view, a_line, b_line)
+            else:
+                try:
+                    cached = file_cache.get(path)
+                    text = cached.lines(a_line, b_line) if cached else LineIndex(path).read(a_line, b_line)
+                except FileNotFoundError:
+                    return f'File under path not found: {path}'
+                except Exception as e:
+                    return f'Unable to read {path}: {e}'
 
             return dumps(
                 {
@@ -409,61 +491,27 @@ class FunctionHandler:
             if not os.path.exists(path):
                 return f'Directory not found: {path}'
 
-            # Recursively list like `ls -R`, respecting .gitignore
-            output_lines: List[str] = []
-            # Top-level directory: use "." as ls -R does
-            items = os.listdir(path)
-            if '.git' in items:
-                items.remove('.git')
-            ignored = get_ignored_files(items, path)
-            visible = sorted([i for i in items if i not in ignored])
-            output_lines.append('.:')
-            if visible:
-                output_lines.append(' '.join(visible))
-            output_lines.append('')
-
-            # Recurse into subdirectories
-            for root, dirs, files in os.walk(path):
-                # always skip `.git` directory from traversal
-                if '.git' in dirs:
-                    dirs.remove('.git')
-                rel = os.path.relpath(root, path)
-                if rel == '.':
-                    continue
-
-                # filter ignored entries
-                rel_paths = [os.path.relpath(os.path.join(root, name), path) for name in dirs + files]
-                ignored = get_ignored_files(rel_paths, path)
-
-                entries: List[str] = []
-                for name in sorted(dirs):
-                    relp = os.path.relpath(os.path.join(root, name), path)
-                    if relp in ignored:
-                        continue
-                    entries.append(name)
-                for name in sorted(files):
-                    relp = os.path.relpath(os.path.join(root, name), path)
-                    if relp in ignored:
-                        continue
-                    entries.append(name)
-
-                output_lines.append(f'./{rel}:')
-                if entries:
-                    output_lines.append(' '.join(entries))
-                output_lines.append('')
+            depth = args_json.get('depth')
+            pattern = args_json.get('glob')
+            offset = args_json.get('offset', 0)
+            limit = args_json.get('limit', DEFAULT_PAGE_LIMIT)
+            token = args_json.get('continuation_token')
+            if not (
+                (depth is None or (isinstance(depth, int) and depth > 0))
+                and (pattern is None or isinstance(pattern, str))
+                and (isinstance(offset, int) and offset >= 0)
+                and (isinstance(limit, int) and limit > 0)
+                and (token is None or isinstance(token, str))
+            ):
+                return (
+                    'Wrong attributes passed: depth(int > 0), glob(str), offset(int >= 0), limit(int > 0), '
+                    'continuation_token(str) are all optional'
+                )
 
-            content_text = '\n'.join(output_lines).rstrip('\n')
-            # apply same 5k char limit
-            return dumps(
-                {
-                    'content': content_text[:5000]
-                    + (
-                        f'…[truncated] response is too long: {len(content_text)}'
-                        if len(content_text) > 5000
-                        else ''
-                    )
-                }
-            )
+            # Recursively list like `ls -R`, respecting .gitignore, one page at a time
+            index = find_project_index(path)
+            walk = index.walk if index else ignore_checker(path).walk
+            return dumps(list_directory(path, walk, depth, pattern, offset, limit, token))
         else:
             return f"Called function doen't exists: {func_name}"
 
@@ -487,6 +535,9 @@ if __name__ == '__main__':
         # list working directory tree (honours .gitignore)
         python -m plugins.function_handler get_working_directory_content '{"directory_path": "."}'
 
+        # list only python files two levels deep, 100 entries per page
+        python -m plugins.function_handler get_working_directory_content '{"directory_path": ".", "glob": "*.py", "depth": 2, "limit": 100}'
+
         # overwrite /tmp/demo.txt
         echo hello > /tmp/demo.txt
         python -m plugins.function_handler replace_text_for_whole_file '{"file_path": "/tmp/demo.txt", "create": false, "content": "new text"}'
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import zlib
+from array import array
+from typing import Any, Dict, List, Tuple
+
+from llm_runner import Roles, SublimeInputContent, drop_all, read_all_cache, write_to_cache  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = 'chat_history.jl'
+INDEX_FILE = 'chat_history.idx'
+
+# Index header: size of the history file covered by the index, whether its last item is a user one,
+# and the inode and the checksum of the first line of the indexed file
+HEADER_SIZE = 4
+FINGERPRINT_PREFIX = 4096  # bytes of the first line checksummed
+
+
+class HistoryItem:
+    __slots__ = ('role', 'content', 'path', 'tool_call_id')
+
+    def __init__(self, entry: Dict[str, Any]) -> None:
+        self.role = _role(entry.get('role'))
+        self.content: str = entry.get('content') or ''
+        self.path: str | None = entry.get('path')
+        self.tool_call_id: str | None = entry.get('tool_call_id')
+
+
+class HistoryStore:
+    """Chat history reader/writer backed by a turn number → byte offset index.
+
+    The index lives alongside the `llm_runner` history file and is extended incrementally,
+    so reading the last turns costs proportionally to their size rather than to the whole history.
+    Falls back to `read_all_cache` if the history file isn't there to be indexed.
+    """
+
+    def __init__(self, cache_path: str) -> None:
+        self.cache_path = cache_path
+        self.history_path = os.path.join(cache_path, HISTORY_FILE)
+        self.index_path = os.path.join(cache_path, INDEX_FILE)
+        self.offsets = array('Q')
+        self.indexed_size: int = 0
+        self.ends_with_user: bool = False
+        self.fingerprint: Tuple[int, int] = (0, 0)
+        self._load_index()
+
+    def turns_count(self) -> int:
+        if not self._update_index():
+            return len(split_turns(read_all_cache(self.cache_path)))
+        return len(self.offsets)
+
+    def read_turns(self, start: int, stop: int | None = None) -> List[List[Any]]:
+        """Returns turns `[start:stop]` of the history, each one is a list of its items"""
+        if self._update_index():
+            try:
+                return self._read_indexed_turns(start, stop)
+            except (OSError, ValueError, AttributeError) as error:
+                logger.warning('The history index %s is stale, rebuilding it: %s', self.index_path, error)
+                self._reset_index()
+                if self._update_index():
+                    try:
+                        return self._read_indexed_turns(start, stop)
+                    except (OSError, ValueError, AttributeError) as error:
+                        logger.warning('Failed to read the history %s: %s', self.history_path, error)
+        return split_turns(read_all_cache(self.cache_path))[start:stop]
+
+    def _read_indexed_turns(self, start: int, stop: int | None) -> List[List[Any]]:
+        turns_count = len(self.offsets)
+        stop = turns_count if stop is None else min(stop, turns_count)
+        if start >= stop:
+            return []
+
+        begin = self.offsets[start]
+        end = self.offsets[stop] if stop < turns_count else self.indexed_size
+        with open(self.history_path, 'rb') as file:
+            file.seek(begin)
+            chunk = file.read(end - begin)
+
+        items = [HistoryItem(json.loads(line)) for line in chunk.splitlines() if line.strip()]
+        return split_turns(items)
+
+    def read_turn(self, number: int) -> List[Any]:
+        turns = self.read_turns(number, number + 1)
+        return turns[0] if turns else []
+
+    def append(self, items: List[SublimeInputContent]):
+        """Appends all the `items` to the history and extends the index once afterwards"""
+        for item in items:
+            write_to_cache(self.cache_path, item)
+        self._update_index()
+
+    def drop(self):
+        drop_all(self.cache_path)
+        self._reset_index()
+        try:
+            os.remove(self.index_path)
+        except FileNotFoundError:
+            pass
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'rb') as file:
+                data = array('Q', file.read())
+        except (OSError, ValueError):
+            return
+        if len(data) < HEADER_SIZE:
+            return
+        self.indexed_size, self.ends_with_user = data[0], bool(data[1])
+        self.fingerprint = (data[2], data[3])
+        self.offsets = data[HEADER_SIZE:]
+
+    def _reset_index(self):
+        self.offsets = array('Q')
+        self.indexed_size = 0
+        self.ends_with_user = False
+        self.fingerprint = (0, 0)
+
+    def _save_index(self):
+        data = array('Q', [self.indexed_size, int(self.ends_with_user), *self.fingerprint])
+        data.extend(self.offsets)
+        with open(self.index_path, 'wb') as file:
+            file.write(data.tobytes())
+
+    def _update_index(self) -> bool:
+        """Indexes the history appended since the last call, returns False if there's no history file"""
+        try:
+            size = os.path.getsize(self.history_path)
+        except OSError:
+            return False
+
+        fingerprint = self._file_fingerprint()
+        if fingerprint is None:
+            return False
+        if fingerprint != self.fingerprint or size < self.indexed_size:  # history was dropped or rewritten
+            self._reset_index()
+            self.fingerprint = fingerprint
+
+        if size == self.indexed_size:
+            return True
+
+        try:
+            self._scan()
+        except (OSError, ValueError, AttributeError) as error:
+            if not self.indexed_size:
+                logger.warning('Failed to index the history %s: %s', self.history_path, error)
+                return False
+            # The history was rewritten in place past the indexed size, an offset may fall mid-line
+            logger.warning('The history index %s is stale, rebuilding it: %s', self.index_path, error)
+            self._reset_index()
+            self.fingerprint = fingerprint
+            try:
+                self._scan()
+            except (OSError, ValueError, AttributeError) as error:
+                logger.warning('Failed to index the history %s: %s', self.history_path, error)
+                self._reset_index()
+                return False
+
+        try:
+            self._save_index()
+        except OSError as error:
+            logger.warning('Failed to save the history index %s: %s', self.index_path, error)
+        return True
+
+    def _scan(self):
+        """Indexes the complete lines past the indexed size"""
+        offset = self.indexed_size
+        offsets = array('Q', self.offsets)
+        ends_with_user = self.ends_with_user
+        with open(self.history_path, 'rb') as file:
+            file.seek(offset)
+            for line in file:
+                if not line.endswith(b'\n'):
+                    break  # the line is still being written
+                if line.strip():
+                    is_user = _role(json.loads(line).get('role')) == Roles.User
+                    if not offsets or (is_user and not ends_with_user):
+                        offsets.append(offset)
+                    ends_with_user = is_user
+                offset += len(line)
+        self.offsets, self.indexed_size, self.ends_with_user = offsets, offset, ends_with_user
+
+    def _file_fingerprint(self) -> Tuple[int, int] | None:
+        """Returns the inode of the history file and the checksum of its first line"""
+        try:
+            with open(self.history_path, 'rb') as file:
+                head = file.read(FINGERPRINT_PREFIX)
+                inode = os.fstat(file.fileno()).st_ino
+        except OSError:
+            return None
+        newline = head.find(b'\n')
+        return inode, zlib.crc32(head if newline < 0 else head[: newline + 1])
+
+
+def split_turns(items: List[Any]) -> List[List[Any]]:
+    """Groups history items into turns, each turn starts with the user messages that follow a response"""
+    turns: List[List[Any]] = []
+    for item in items:
+        if not turns or (item.role == Roles.User and turns[-1][-1].role != Roles.User):
+            turns.append([])
+        turns[-1].append(item)
+    return turns
+
+
+def _role(value: Any) -> Any:
+    name = str(value).lower()
+    if name == 'user':
+        return Roles.User
+    if name == 'assistant':
+        return Roles.Assistant
+    if name == 'tool':
+        return Roles.Tool
+    return value
+
+
+_stores: Dict[str, HistoryStore] = {}
+
+
+def history_store(cache_path: str) -> HistoryStore:
+    """Returns the store for `cache_path`, keeping its index in memory between calls"""
+    store = _stores.get(cache_path)
+    if store is None:
+        store = _stores[cache_path] = HistoryStore(cache_path)
+    return store
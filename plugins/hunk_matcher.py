@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Tuple
+
+
+class Replacement:
+    __slots__ = ('start', 'end', 'new_lines')
+
+    def __init__(self, start: int, end: int, new_lines: List[str]) -> None:
+        self.start = start  # original line coordinates, [start, end)
+        self.end = end
+        self.new_lines = new_lines
+
+
+class AmbiguousMatch(Exception):
+    """The fast path can't prove that its match is the one the sequential scan would find."""
+
+
+def apply_hunks(original: str, hunks: List[Tuple[str, str]]) -> str:
+    """
+    Apply hunks **in order**; match each old-block by ignoring leading whitespace.
+    Replace the first matching occurrence of each old block in the file.
+    Raises RuntimeError if a hunk cannot be located.
+
+    Normalized lines are computed once and indexed by content, so each hunk is located
+    by probing only the positions of its first line, and all replacements are applied
+    in a single rebuild pass. Whenever a hunk may match text inserted by a previous
+    hunk the whole patch is re-applied by `apply_hunks_by_scan`, which defines the semantics.
+    """
+    try:
+        return _apply_hunks_indexed(original, hunks)
+    except AmbiguousMatch:
+        return apply_hunks_by_scan(original, hunks)
+
+
+def _apply_hunks_indexed(original: str, hunks: List[Tuple[str, str]]) -> str:
+    orig_lines = original.splitlines(keepends=True)
+    normalized = [line.lstrip() for line in orig_lines]
+
+    positions: Dict[str, List[int]] = {}
+    for i, line in enumerate(normalized):
+        positions.setdefault(line, []).append(i)
+
+    replacements: List[Replacement] = []  # in the order of application
+
+    for old, new in hunks:
+        old_lines = old.splitlines(keepends=True)
+        new_lines = new.splitlines(keepends=True) if new else []
+
+        # If old block is empty, append new lines at EOF
+        if not old_lines or (len(old_lines) == 1 and old_lines[0] == '\n'):
+            replacements.append(Replacement(len(orig_lines), len(orig_lines), new_lines))
+            continue
+
+        old_normalized = [line.lstrip() for line in old_lines]
+        size = len(old_normalized)
+
+        found: int | None = None
+        for i in positions.get(old_normalized[0], ()):
+            if normalized[i : i + size] == old_normalized and not _overlaps(replacements, i, i + size):
+                found = i
+                break
+
+        # A match involving previously inserted lines would have been found first by the sequential scan
+        limit = found if found is not None else len(orig_lines) + 1
+        for replacement in replacements:
+            if replacement.end <= limit and _matches_around(
+                replacement, replacements, normalized, old_normalized
+            ):
+                raise AmbiguousMatch()
+
+        if found is None:
+            raise AmbiguousMatch()  # let the sequential scan report the failure
+
+        replacements.append(Replacement(found, found + size, new_lines))
+
+    # Rebuild the text in one pass, replacements at the same spot keep their application order
+    result: List[str] = []
+    cursor = 0
+    for replacement in sorted(replacements, key=lambda r: r.start):
+        result.extend(orig_lines[cursor : replacement.start])
+        result.extend(replacement.new_lines)
+        cursor = max(cursor, replacement.end)
+    result.extend(orig_lines[cursor:])
+    return ''.join(result)
+
+
+def _overlaps(replacements: List[Replacement], start: int, end: int) -> bool:
+    return any(r.start < end and start < r.end for r in replacements if r.start != r.end)
+
+
+def _matches_around(
+    replacement: Replacement,
+    replacements: List[Replacement],
+    normalized: List[str],
+    old_normalized: List[str],
+) -> bool:
+    """Checks whether the old block matches any window that overlaps the inserted lines of `replacement`
+    (or spans the junction it leaves behind if nothing was inserted)."""
+    reach = len(old_normalized) - 1
+    lower, upper = replacement.start - reach, replacement.end + reach
+    for other in replacements:
+        if other is replacement:
+            continue
+        if other.start < upper and lower < max(other.end, other.start + 1):
+            raise AmbiguousMatch()  # a match may span several replacements, the window can't tell
+    window_start = max(0, lower)
+    window_end = min(len(normalized), upper)
+
+    window = (
+        normalized[window_start : replacement.start]
+        + [line.lstrip() for line in replacement.new_lines]
+        + normalized[replacement.end : window_end]
+    )
+    inserted_start = replacement.start - window_start
+    inserted_end = inserted_start + len(replacement.new_lines)
+    for i in range(max(0, inserted_start - reach), min(inserted_end, len(window) - reach)):
+        if window[i : i + len(old_normalized)] == old_normalized:
+            return True
+    return False
+
+
+def apply_hunks_by_scan(original: str, hunks: List[Tuple[str, str]]) -> str:
+    """
+    Apply hunks **in order**; match each old-block by ignoring leading whitespace.
+    Replace the first matching occurrence of each old block in the file.
+    Raises RuntimeError if a hunk cannot be located.
+    """
+    # Split original text into lines with endings
+    orig_lines = original.splitlines(keepends=True)
+
+    for idx, (old, new) in enumerate(hunks, start=1):
+        # Old/new blocks as lists of lines (with endings)
+        old_lines = old.splitlines(keepends=True)
+        new_lines = new.splitlines(keepends=True) if new else []
+
+        # If old block is empty, append new lines at EOF
+        if not old_lines or (len(old_lines) == 1 and old_lines[0] == '\n'):
+            orig_lines.extend(new_lines)
+            continue
+
+        # Search for first position where stripped lines match
+        found = False
+        for i in range(len(orig_lines) - len(old_lines) + 1):
+            match = True
+            for j, old_line in enumerate(old_lines):
+                # Compare ignoring leading whitespace
+                if orig_lines[i + j].lstrip() != old_line.lstrip():
+                    match = False
+                    break
+            if match:
+                # Replace these lines
+                orig_lines = orig_lines[:i] + new_lines + orig_lines[i + len(old_lines) :]
+                found = True
+                break
+
+        if not found:
+            snippet = old_lines[0].lstrip() or '<newline>'
+            raise RuntimeError(
+                f'Hunk {idx}: context not found – failed to locate "{snippet.strip()}..." in target file'
+            )
+
+    # Reconstruct updated text
+    return ''.join(orig_lines)
+
+
+# ---------------------------------------------------------------------------
+# Fuzzy location, used once the exact matching has failed
+# ---------------------------------------------------------------------------
+
+FUZZY_WINDOW = 200  # lines around the search center compared with every window, in each direction
+MIN_CONFIDENCE = 0.75
+MIN_FUZZY_LINES = 3  # non-blank lines an old block needs to be located approximately
+
+
+class HunkLocation(NamedTuple):
+    start: int
+    end: int
+    confidence: float  # 1.0 is an exact match
+    rivals: Tuple[int, ...] = ()  # starts of other, non-overlapping locations just as good
+
+
+def locate_hunk(
+    lines: List[str], old_lines: List[str], anchor: int, hint: int | None = None
+) -> HunkLocation | None:
+    """
+    Returns the best location of `old_lines` within `lines` (both normalized).
+
+    An exact match at or after the `anchor` (the end of the previous hunk) wins, then any other
+    exact match. Otherwise an old block of at least `MIN_FUZZY_LINES` non-blank lines is compared
+    by line edit distance against every window within `FUZZY_WINDOW` lines of the `hint` (if given)
+    or the anchor, allowing the file side to have one line more or less. Without a hint the rest
+    of the file is searched too, there only the windows having half of the old lines in place.
+    Other locations as good as the best one are returned as its `rivals`, unless the hint is
+    strictly closer to the best one.
+    """
+    size = len(old_lines)
+    start = _find_exact(lines, old_lines, anchor)
+    if start is None and anchor:
+        start = _find_exact(lines, old_lines, 0)
+    if start is not None:
+        return HunkLocation(start, start + size, 1.0)
+    if sum(1 for line in old_lines if line) < MIN_FUZZY_LINES:
+        return None
+
+    center = hint if hint is not None else anchor
+    starts = set(range(max(0, center - FUZZY_WINDOW), min(len(lines), center + FUZZY_WINDOW) + 1))
+    if hint is None:
+        # Farther away, only windows with at least half of the old lines in place (give or take a line)
+        offsets: Dict[str, List[int]] = {}
+        for offset, line in enumerate(old_lines):
+            if line:
+                offsets.setdefault(line, []).append(offset)
+        votes: Dict[int, int] = {}
+        for position, line in enumerate(lines):
+            for offset in offsets.get(line, ()):
+                votes[position - offset] = votes.get(position - offset, 0) + 1
+        needed = max(1, (size + 1) // 2)
+        for start, count in votes.items():
+            if count >= needed:
+                starts.update(range(max(0, start - 1), min(len(lines), start + 1) + 1))
+
+    candidates: List[HunkLocation] = []
+    for start in sorted(starts):
+        for length in (size, size - 1, size + 1):
+            if length <= 0 or start + length > len(lines):
+                continue
+            longest = max(size, length)
+            limit = (1.0 - MIN_CONFIDENCE) * longest
+            distance = _line_edit_distance(old_lines, lines[start : start + length], limit)
+            if distance <= limit:
+                candidates.append(HunkLocation(start, start + length, 1.0 - distance / longest))
+    if not candidates:
+        return None
+
+    top = max(candidate.confidence for candidate in candidates)
+    tied = [candidate for candidate in candidates if candidate.confidence >= top - 1e-9]
+    tied.sort(key=lambda candidate: abs(candidate.start - center))
+    best = tied[0]
+    rivals = tuple(
+        candidate.start
+        for candidate in tied[1:]
+        if (candidate.start >= best.end or candidate.end <= best.start)
+        and (hint is None or abs(candidate.start - center) == abs(best.start - center))
+    )
+    return best._replace(rivals=tuple(sorted(set(rivals))))
+
+
+def apply_hunks_fuzzy(
+    original: str, hunks: List[Tuple[str, str]], hints: List[int | None] | None = None
+) -> Tuple[str, List[float]]:
+    """
+    Apply hunks **in order**, locating each one with `locate_hunk` around the end of the previous one.
+    `hints` are 1-based original line numbers from `@@ -N` headers, if the patch has them.
+    Returns the new text and the confidence of each hunk location.
+    Raises RuntimeError if a hunk cannot be located with at least `MIN_CONFIDENCE`,
+    or if it's located approximately at several places equally well.
+    """
+    orig_lines = original.splitlines(keepends=True)
+    normalized = [_normalize(line) for line in orig_lines]
+    confidences: List[float] = []
+    anchor = 0
+    shift = 0  # line count delta introduced by the previous hunks, to map hints into the current text
+
+    for idx, (old, new) in enumerate(hunks, start=1):
+        old_lines = old.splitlines(keepends=True)
+        new_lines = new.splitlines(keepends=True) if new else []
+
+        # If old block is empty, append new lines at EOF
+        if not old_lines or (len(old_lines) == 1 and old_lines[0] == '\n'):
+            orig_lines.extend(new_lines)
+            normalized.extend(_normalize(line) for line in new_lines)
+            confidences.append(1.0)
+            continue
+
+        hint = hints[idx - 1] if hints and idx - 1 < len(hints) else None
+        location = locate_hunk(
+            normalized, [_normalize(line) for line in old_lines], anchor, hint - 1 + shift if hint else None
+        )
+        snippet = old_lines[0].strip() or '<newline>'
+        if location is None or location.confidence < MIN_CONFIDENCE:
+            best = ''
+            if location:
+                best = f', the closest candidate at line {location.start + 1}'
+                best += f' has confidence {location.confidence:.2f}'
+            raise RuntimeError(
+                f'Hunk {idx}: context not found – failed to locate "{snippet}..." in target file{best}'
+            )
+        if location.rivals:
+            places = ', '.join(str(start + 1) for start in (location.start, *location.rivals))
+            raise RuntimeError(
+                f'Hunk {idx}: context "{snippet}..." matches lines {places} equally well,'
+                ' add more unchanged context lines or a "@@ -N" line number header to pick one'
+            )
+
+        orig_lines[location.start : location.end] = new_lines
+        normalized[location.start : location.end] = [_normalize(line) for line in new_lines]
+        confidences.append(location.confidence)
+        anchor = location.start + len(new_lines)
+        shift += len(new_lines) - (location.end - location.start)
+
+    return ''.join(orig_lines), confidences
+
+
+def _normalize(line: str) -> str:
+    return ' '.join(line.split())
+
+
+def _find_exact(lines: List[str], old_lines: List[str], start: int) -> int | None:
+    first, size = old_lines[0], len(old_lines)
+    i = start
+    while True:
+        try:
+            i = lines.index(first, i)
+        except ValueError:
+            return None
+        if lines[i : i + size] == old_lines:
+            return i
+        i += 1
+
+
+def _line_edit_distance(a: List[str], b: List[str], limit: float) -> float:
+    """
+    Levenshtein distance over lines where replacing a line costs as much as the lines differ,
+    gives up with `limit + 1` as soon as it can't stay within `limit`.
+    """
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, line_a in enumerate(a, start=1):
+        current = [float(i)] + [0.0] * len(b)
+        for j, line_b in enumerate(b, start=1):
+            current[j] = min(
+                previous[j] + 1, current[j - 1] + 1, previous[j - 1] + _replacement_cost(line_a, line_b)
+            )
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+@lru_cache(maxsize=65536)
+def _replacement_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    matcher = SequenceMatcher(None, a, b)
+    if matcher.real_quick_ratio() < MIN_CONFIDENCE:
+        return 1.0
+    return 1.0 - matcher.ratio()
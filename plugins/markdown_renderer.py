@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import re
+import threading
+from typing import Callable, List
+
+FENCE_PATTERN = re.compile(r'^\s{0,3}(`{3,}|~{3,})')
+LIST_ITEM_PATTERN = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s')
+REFERENCE_DEFINITION_PATTERN = re.compile(r'^ {0,3}\[[^\]]+\]:[ \t]*\S.*$', re.MULTILINE)
+
+OPENING_THINK = '<think>'
+CLOSING_THINK = '</think>'
+
+
+class IncrementalMarkdownRenderer:
+    """Renders a growing markdown text by caching the html of already closed blocks.
+
+    A block is considered closed once a blank line is followed by a new unindented line
+    outside of a fenced code block, a `<think>` section or a list. Closed blocks are rendered
+    exactly once, every subsequent call renders only the still open tail of the text.
+    Reference link definitions of the whole text are passed along with every block, and
+    a new definition makes all the blocks rendered anew, since any of them may refer to it.
+
+    `render` and `reset` may be called from different threads, `lock` serializes them.
+
+    Args:
+        render_block (Callable[[str], str]): Converts a single markdown block into html.
+    """
+
+    def __init__(self, render_block: Callable[[str], str]) -> None:
+        self.render_block = render_block
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Drop all the cached blocks, so the next `render` call starts from scratch."""
+        with self.lock:
+            self.text: str = ''
+            self.definitions: str = ''
+            self.closed_html: List[str] = []
+            self.closed_offset: int = 0
+
+    def render(self, text: str) -> str:
+        """Returns the html of the whole `text`.
+
+        Falls back to the full re-render if `text` doesn't extend the previously rendered one.
+        """
+        with self.lock:
+            definitions = reference_definitions(text)
+            if definitions != self.definitions or not text.startswith(self.text[: self.closed_offset]):
+                self.reset()
+                self.definitions = definitions
+            self.text = text
+
+            for block in split_closed_blocks(text[self.closed_offset :]):
+                self.closed_html.append(self._render_block(block))
+                self.closed_offset += len(block)
+
+            tail = text[self.closed_offset :]
+            tail_html = self._render_block(tail) if tail.strip() else ''
+            return ''.join(self.closed_html) + tail_html
+
+    def _render_block(self, block: str) -> str:
+        return self.render_block(f'{block}\n\n{self.definitions}\n' if self.definitions else block)
+
+
+def reference_definitions(text: str) -> str:
+    """Returns the reference link definitions among the complete lines of `text`"""
+    complete = text[: text.rfind('\n') + 1]
+    return '\n'.join(match.group(0) for match in REFERENCE_DEFINITION_PATTERN.finditer(complete))
+
+
+def split_closed_blocks(text: str) -> List[str]:
+    """Returns the closed blocks at the beginning of `text`, the open tail is left out."""
+    blocks: List[str] = []
+    block_start = 0
+    offset = 0
+    fence: str | None = None
+    in_think = False
+    in_list = False
+    pending_blank = False
+
+    for line in text.splitlines(keepends=True):
+        if not line.endswith('\n'):
+            break  # the last line is still being streamed
+
+        line_start = offset
+        offset += len(line)
+        stripped = line.strip()
+
+        if fence:
+            if stripped.startswith(fence) and not stripped[len(fence) :].strip():
+                fence = None
+            continue
+
+        if in_think:
+            in_think = CLOSING_THINK not in line
+            continue
+
+        if not stripped:
+            pending_blank = True
+            continue
+
+        is_list_item = LIST_ITEM_PATTERN.match(line) is not None
+        if pending_blank and not line[0].isspace() and not (in_list and is_list_item):
+            blocks.append(text[block_start:line_start])
+            block_start = line_start
+        pending_blank = False
+
+        if is_list_item:
+            in_list = True
+        elif not line[0].isspace():
+            in_list = False
+
+        fence_match = FENCE_PATTERN.match(line)
+        if fence_match:
+            fence = fence_match.group(1)
+        elif OPENING_THINK in line:
+            in_think = CLOSING_THINK not in line[line.rindex(OPENING_THINK) :]
+
+    return blocks
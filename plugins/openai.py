@@ -2,14 +2,15 @@ from __future__ import annotations
 
 import logging
 
-from llm_runner import drop_all  # type: ignore
 from sublime import Edit, Region, View, active_window, load_settings
 from sublime_plugin import TextCommand
 
 from .assistant_settings import CommandMode
+from .history_store import history_store
 from .load_model import get_cache_path, get_model_or_default
 from .openai_base import CommonMethods
-from .output_panel import SharedOutputPanelListener
+from .output_panel import HISTORY_OFFSET_KEY, SharedOutputPanelListener
+from .sent_sheets import sent_sheets
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +31,8 @@ class Openai(TextCommand):
             Openai.create_new_tab(listener)
         elif mode == CommandMode.refresh_output_panel.value:
             Openai.refresh_output_panel(listener)
+        elif mode == CommandMode.load_older_history.value:
+            listener.load_older_history(window=active_window())
         else:
             logger.debug('Openai view: %s', self.view)
             assistant = get_model_or_default(self.view)
@@ -41,12 +44,14 @@ class Openai(TextCommand):
 
         path = get_cache_path(view)
 
-        drop_all(path)
+        history_store(path).drop()
+        sent_sheets(path).drop()
         view = listener.get_output_view_(window=window)
         view.set_read_only(False)
         region = Region(0, view.size())
         view.erase(edit, region)
         view.set_read_only(True)
+        view.settings().erase(HISTORY_OFFSET_KEY)
 
     @classmethod
     def create_new_tab(cls, listener: SharedOutputPanelListener):
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
+import functools
 import logging
-from typing import Any, Dict, List
+import time
+from typing import Any, Callable, Dict, List, Tuple
 
 import sublime
 from llm_runner import (
     AssistantSettings,  # type: ignore
     InputKind,  # type: ignore
     PromptMode,  # type: ignore
+    Roles,  # type: ignore
     SublimeInputContent,  # type: ignore
     Worker,  # type: ignore
 )
@@ -18,20 +21,38 @@ from .assistant_settings import (
 )
 from .buffer import BufferContentManager
 from .errors.OpenAIException import WrongUserInputException, present_error, present_error_str
-from .function_handler import FunctionHandler
+from .file_cache import DEFAULT_BUDGET_MB, file_cache
+from .history_store import history_store
 from .image_handler import ImageValidator
 from .load_model import get_cache_path
 from .output_panel import SharedOutputPanelListener
+from .output_tail import tail_lines
 from .phantom_streamer import PhantomStreamer
+from .prompt_prefix import reusable_prefix_tokens
+from .request_registry import (
+    DEFAULT_MAX_CONCURRENT,
+    DEFAULT_MAX_CONCURRENT_PER_PROVIDER,
+    ActiveRequest,
+    request_registry,
+)
 from .response_manager import ResponseManager
+from .sent_sheets import SentSheets, sent_sheets
 from .sheet_toggle import VIEW_TOGGLE_KEY
+from .status_bar import StatusBarMode
+from .tool_executor import ToolExecutor
+from .update_scheduler import DEFAULT_INTERVAL_MS, update_scheduler
+from .worker_pool import DEFAULT_IDLE_TIMEOUT, DEFAULT_MAX_SIZE, WorkerPool, probe_endpoint
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONTEXT_TOKEN_BUDGET = 0
+REQUEST_POLL_INTERVAL_MS = 50
+CANCEL_POLL_INTERVAL_MS = 10
+CANCEL_STOP_TIMEOUT = 5  # seconds a cancelled worker gets to stop before its partial response is dropped
+PROMPT_CACHE_STATUS = 'openai_prompt_cache'
 
-class CommonMethods:
-    worker: Worker | None = None
 
+class CommonMethods:
     @classmethod
     def process_openai_command(cls, view: View, assistant: AssistantSettings, kwargs: Dict[str, Any]):
         logger.debug('Openai started')
@@ -40,7 +61,16 @@ class CommonMethods:
 
         region: Region | None = None
 
-        items = get_sheets_context(window=view.window() or active_window())
+        sent = (
+            sent_sheets(get_cache_path(view))
+            if settings.get('sheets_delta_context', False) and assistant.output_mode == PromptMode.View
+            else None
+        )
+        items = get_sheets_context(
+            window=view.window() or active_window(),
+            token_budget=context_token_budget(assistant.name),
+            sent=sent,
+        )
 
         logger.debug('mode: %s', mode)
         logger.debug('Region: %s', region)
@@ -101,11 +131,14 @@ class CommonMethods:
     def get_output_lines(cls, view_name: str, limit: int) -> str:
         output_view = sublime.active_window().find_output_panel(view_name)
         if output_view:
-            content = output_view.substr(sublime.Region(0, output_view.size()))
-            lines = content.splitlines()
-            if limit == -1:
-                return '\n'.join(lines)
-            return '\n'.join(lines[-limit:])
+            lines = tail_lines(
+                lambda begin, end: output_view.substr(sublime.Region(begin, end)),
+                output_view.size(),
+                limit,
+                collapse_repeats=settings.get('build_output_collapse_repeats', False),  # type: ignore
+                errors_only=settings.get('build_output_errors_only', False),  # type: ignore
+            )
+            return '\n'.join(lines)
         return ''
 
     @classmethod
@@ -141,6 +174,8 @@ class CommonMethods:
     ):
         window = view.window() or sublime.active_window()
         logger.debug('handle_chat_completion hit')
+        if assistant:
+            cls.prewarm(view, assistant)
         sublime.active_window().show_input_panel(
             'Question:',
             window.settings().get('OPENAI_INPUT_TMP_STORAGE') or '',  # type: ignore
@@ -169,12 +204,26 @@ class CommonMethods:
         CommonMethods.on_input(view, assistant, user_input)
 
     @classmethod
-    def on_input(
-        cls,
-        view: View,
-        assistant: AssistantSettings,
-        inputs: List[SublimeInputContent],
-    ):
+    def prewarm(cls, view: View, assistant: AssistantSettings):
+        """Gets a worker ready and checks the endpoint while the user is typing the question"""
+        window, path, proxy = cls.request_target(view)
+        url = assistant.url
+
+        def prewarm_async():
+            worker_pool.prewarm(window.id(), path, url, proxy)
+            if not url:
+                return
+            try:
+                elapsed = probe_endpoint(url, proxy)
+                logger.debug('endpoint %s reached in %.1f ms', url, elapsed * 1000)
+            except (OSError, ValueError) as error:
+                logger.warning('endpoint %s is unreachable: %s', url, error)
+
+        sublime.set_timeout_async(prewarm_async)
+
+    @classmethod
+    def request_target(cls, view: View) -> Tuple[Window, str, str | None]:
+        """Returns the window, the cache path and the proxy (if any) of a request from `view`"""
         path = get_cache_path(view)
 
         proxy = ''
@@ -184,68 +233,205 @@ class CommonMethods:
             proxy = f'{proxy_obj.get("address")}:{proxy_obj.get("port")}'
 
         window = view.window() or active_window()
-        cls.worker = Worker(
-            window_id=window.id(),
-            path=path,
-            proxy=proxy if proxy else None,
-        )
+        return window, path, proxy if proxy else None
 
-        handler = (
-            PhantomCapture(view, inputs).phantom_handler
-            if assistant.output_mode == PromptMode.Phantom
-            else ViewCapture(view).tab_handler
+    @classmethod
+    def on_input(
+        cls,
+        view: View,
+        assistant: AssistantSettings,
+        inputs: List[SublimeInputContent],
+    ):
+        window, path, proxy = cls.request_target(view)
+        chat_path = path if assistant.output_mode == PromptMode.View else None
+        allowed, reason = request_registry.can_start(assistant.url, chat_path)
+        if not allowed:
+            present_error_str('OpenAI error', reason)
+            return
+
+        worker, timing = worker_pool.acquire(window.id(), path, assistant.url, proxy)
+
+        on_cancel: Callable[[str], None] | None = None
+        if assistant.output_mode == PromptMode.View:  # a phantom keeps its partial response until it's closed
+            on_cancel = functools.partial(cls.save_partial_response, path, inputs)
+
+        capture: PhantomCapture | ViewCapture
+        if assistant.output_mode == PromptMode.Phantom:
+            capture = PhantomCapture(view, inputs)
+            output_handler = capture.phantom_handler
+        else:
+            capture = ViewCapture(view)
+            output_handler = capture.tab_handler
+
+        label = cls.request_label(assistant, inputs)
+        request = ActiveRequest(
+            window.id(), view.id(), assistant.url, worker, label, on_cancel, chat_path, output=capture
         )
+        handler = request.wrap(timing.wrap(output_handler))
 
         fn_handler = FunctionCapture(window).fn_handler
 
-        cls.worker.run(
+        def error_handler(content: str) -> None:
+            request_registry.finish(worker)
+            ErrorCapture.error_handler(content)
+
+        worker.run(
             view.id(),
             assistant.output_mode,
             inputs,
             assistant,
             handler,
-            ErrorCapture.error_handler,
+            error_handler,
             fn_handler,
         )
+        request_registry.add(request)
+
+        # Items go from the most stable (sheets) to the most volatile (selection, command)
+        # to keep the longest prefix a provider side prompt cache can reuse. It's estimated
+        # only for requests actually sent, so the next one is compared against this one
+        status_hint_options: List[str] = settings.get('status_hint', [])  # type: ignore
+        if StatusBarMode.prompt_cache.value in status_hint_options:
+            tokens = reusable_prefix_tokens(path, [item.content for item in inputs])
+            view.set_status(PROMPT_CACHE_STATUS, f'[Prompt prefix reused: ~{tokens / 1000:.1f}k tokens]')
+
+        cls.watch_request(request, view)
 
         if assistant.output_mode == PromptMode.View:
-            ResponseManager.print_requests(
-                SharedOutputPanelListener(),
-                window,
-                inputs,
-            )
             ResponseManager.prepare_to_response(
                 SharedOutputPanelListener(),
                 window,
+                inputs,
             )
 
         logger.debug('spawned successfully')
 
     @classmethod
-    def stop_worker(cls):
-        logger.debug('Stopping worker...')
-        cls.worker.cancel()
+    def request_label(cls, assistant: AssistantSettings, inputs: List[SublimeInputContent]) -> str:
+        commands = [item.content for item in inputs if item.input_kind == InputKind.Command]
+        label = ' '.join((commands[-1] if commands else '').split())
+        return (label[:40] + '…' if len(label) > 40 else label) or assistant.name
+
+    @classmethod
+    def watch_request(cls, request: ActiveRequest, view: View):
+        """Polls the worker off the main thread and drops the request once it's done (or cancelled),
+        so the running state is kept current without asking the worker on key presses"""
+
+        def poll():
+            if request_registry.poll(request):
+                sublime.set_timeout_async(poll, REQUEST_POLL_INTERVAL_MS)
+            elif not request_registry.running(view_id=view.id()):
+                view.erase_status(PROMPT_CACHE_STATUS)
+
+        sublime.set_timeout_async(poll, REQUEST_POLL_INTERVAL_MS)
+
+    @classmethod
+    def stop_worker(cls, view: View):
+        """Cancels the requests started from `view`, or all the requests of its window if there's none"""
+        window = view.window() or active_window()
+        requests = request_registry.running(view_id=view.id())
+        requests = requests or request_registry.running(window_id=window.id())
+        for request in requests:
+            cls.cancel_request(request)
 
     @classmethod
-    def is_worker_alive(cls) -> bool:
-        logger.debug('Checking if worker is alive...')
-        return cls.worker.is_alive()
+    def cancel_request(cls, request: ActiveRequest):
+        """Cancels the request and quiets its output at once, without waiting for the worker to stop.
+
+        No chunk gets past the request's handler from now on, the ones already buffered are flushed
+        so the output matches the partial response, which is saved once the worker has stopped
+        (and dropped if it hasn't within `CANCEL_STOP_TIMEOUT`).
+        """
+        logger.debug('Cancelling request %s...', request.id)
+        request.cancel()
+        request.worker.cancel()
+        worker_pool.discard(request.worker)  # whatever state a cancelled worker is left in, it's not reused
+        request_registry.remove(request)
+        if request.output is not None:
+            update_scheduler.finish(request.output)
+
+        def on_quiet():
+            # Runs on the main thread after the UI updates queued so far
+            quiet = time.perf_counter() - (request.cancelled_at or 0)
+            deadline = time.perf_counter() + CANCEL_STOP_TIMEOUT
+            sublime.set_timeout_async(lambda: cls.finish_cancel(request, quiet, deadline))
+
+        sublime.set_timeout(on_quiet)
+
+    @classmethod
+    def finish_cancel(cls, request: ActiveRequest, quiet: float, deadline: float):
+        is_alive = request.worker.is_alive()
+        if is_alive and time.perf_counter() < deadline:
+            sublime.set_timeout_async(
+                lambda: cls.finish_cancel(request, quiet, deadline), CANCEL_POLL_INTERVAL_MS
+            )
+            return
+
+        stopped = None if is_alive else time.perf_counter() - (request.cancelled_at or 0)
+        request_registry.record_cancel(quiet, stopped)
+        if is_alive:
+            # The worker may still write the history, a partial response saved now could interleave with it.
+            # It's out of the pool, so being alive means it's still on the cancelled request.
+            logger.warning('request %s: the worker is still running, partial response dropped', request.id)
+            return
+        if request.on_cancel and request.partial:
+            request.on_cancel(request.partial)
+
+    @classmethod
+    def save_partial_response(cls, path: str, inputs: List[SublimeInputContent], partial: str):
+        """Saves the response of a cancelled request, along with its input unless the worker saved that"""
+        store = history_store(path)
+        turns = store.turns_count()
+        last_turn = store.read_turn(turns - 1) if turns else []
+
+        last = last_turn[-1] if last_turn else None
+        answered = last is not None and last.role == Roles.Assistant and bool(last.content)
+        if answered and last.content.startswith(partial):
+            return  # the worker saved the response itself
+
+        # The input may have joined an unanswered turn, so it's looked for at the end of its user items
+        items = [item for item in inputs if item.input_kind != InputKind.Sheet]
+        expected = [item.content for item in items]
+        stored = [item.content for item in last_turn if item.role == Roles.User]
+        if not answered and expected and stored[-len(expected) :] == expected:
+            items = []  # the worker saved the input
+        store.append(items + [SublimeInputContent(InputKind.AssistantResponse, partial)])
+        logger.debug('partial response of %s characters saved', len(partial))
+
+    @classmethod
+    def is_worker_alive(cls, view: View) -> bool:
+        if not request_registry.is_running():
+            return False  # the common case, the window isn't even looked up
+        window = view.window() or active_window()
+        return request_registry.is_running(window.id())
 
 
 settings: Settings | None = None
 
+worker_pool = WorkerPool(Worker)
+
 
 def get_marked_sheets(window: Window) -> List[Sheet]:
-    sheets = []
-    for view in window.views():
-        if view and view.settings().get(VIEW_TOGGLE_KEY, False):
-            sheets.append(view.sheet())
-    return sheets
+    """Returns the marked sheets sorted by path, so the request prefix doesn't depend on the tabs order"""
+    views = [view for view in window.views() if view and view.settings().get(VIEW_TOGGLE_KEY, False)]
+    views.sort(key=lambda view: (view.file_name() is None, view.file_name() or view.name(), view.id()))
+    return [view.sheet() for view in views]
 
 
-def get_sheets_context(window: Window) -> List[SublimeInputContent]:
+def get_sheets_context(
+    window: Window, token_budget: int = 0, sent: SentSheets | None = None
+) -> List[SublimeInputContent]:
     sheets = get_marked_sheets(window)
-    return BufferContentManager.wrap_sheet_contents_with_scope(sheets)
+    return BufferContentManager.wrap_sheet_contents_with_scope(sheets, token_budget, sent)
+
+
+def context_token_budget(assistant_name: str | None) -> int:
+    """Token budget for the marked sheets, the assistant's `context_token_budget` overrides the global one"""
+    settings_ = settings or sublime.load_settings('openAI.sublime-settings')
+    assistants: List[Dict[str, Any]] = settings_.get('assistants', [])  # type: ignore
+    for assistant in assistants:
+        if assistant.get('name') == assistant_name and 'context_token_budget' in assistant:
+            return assistant['context_token_budget']
+    return settings_.get('context_token_budget', DEFAULT_CONTEXT_TOKEN_BUDGET)  # type: ignore
 
 
 class InputCompositor:
@@ -267,6 +453,16 @@ class InputCompositor:
 def plugin_loaded():
     global settings
     settings = sublime.load_settings('openAI.sublime-settings')
+    update_scheduler.interval_ms = settings.get('stream_update_interval', DEFAULT_INTERVAL_MS)  # type: ignore
+    file_cache.budget = settings.get('file_cache_budget_mb', DEFAULT_BUDGET_MB) * 1024 * 1024  # type: ignore
+    worker_pool.max_size = settings.get('worker_pool_size', DEFAULT_MAX_SIZE)  # type: ignore
+    worker_pool.idle_timeout = settings.get('worker_idle_timeout', DEFAULT_IDLE_TIMEOUT)  # type: ignore
+    max_concurrent: int = settings.get('max_concurrent_requests', DEFAULT_MAX_CONCURRENT)  # type: ignore
+    per_provider: int = settings.get(  # type: ignore
+        'max_concurrent_requests_per_provider', DEFAULT_MAX_CONCURRENT_PER_PROVIDER
+    )
+    request_registry.max_concurrent = max_concurrent
+    request_registry.max_concurrent_per_provider = per_provider
 
 
 class ErrorCapture:
@@ -277,10 +473,10 @@ class ErrorCapture:
 
 class FunctionCapture:
     def __init__(self, window: Window) -> None:
-        self.window = window
+        self.executor = ToolExecutor(window)
 
     def fn_handler(self, name: str, args: str) -> str:
-        return FunctionHandler.perform_function(name, args, self.window)
+        return self.executor.run(name, args)
 
 
 class ViewCapture:
@@ -290,18 +486,22 @@ class ViewCapture:
     def tab_handler(self, content: str) -> None:
         window: Window = self.view.window()  # type: ignore
 
-        listner = SharedOutputPanelListener()
-
-        ResponseManager.update_output_panel_(listner, window, content)
+        # Keyed by the capture, so the streams of different requests are never flushed into each other
+        update_scheduler.push(self, content, lambda text: self.flush(window, text))
 
         logger.debug('Received data: %s', content)
 
+    def flush(self, window: Window, text: str) -> None:
+        listner = SharedOutputPanelListener()
+
+        ResponseManager.update_output_panel_(listner, window, text)
+
 
 class PhantomCapture:
     def __init__(self, view: View, user_input: List[SublimeInputContent]) -> None:
         self.phantom = PhantomStreamer(view, user_input)
 
     def phantom_handler(self, content: str) -> None:
-        self.phantom.update_completion(content)
+        update_scheduler.push(self, content, self.phantom.update_completion)
 
         logger.debug('Received data: %s', content)
@@ -1,17 +1,19 @@
 from __future__ import annotations
 
+import html
 import logging
 from typing import Any, Dict, List, Tuple
 
 import sublime
-import os
 from llm_runner import AssistantSettings, PromptMode, write_model  # type: ignore
 from sublime import Settings, Window
 from sublime_plugin import ListInputHandler, WindowCommand
 from sublime_types import Value
 
+from .buffer import BufferContentManager
+from .context_packer import PackedSheet
 from .load_model import get_cache_path, get_model_or_default
-from .openai_base import CommonMethods, get_marked_sheets
+from .openai_base import CommonMethods, context_token_budget, get_marked_sheets
 
 logger = logging.getLogger(__name__)
 
@@ -142,20 +144,22 @@ class AIWholeInputHandler(ListInputHandler):
 
     def preview(self, text: str) -> str | sublime.Html:
         sheets = get_marked_sheets(self.window)
-        views = [sheet.view() for sheet in sheets]
-
-        names = []
-        for view in views:
-            if view:
-                name = view.name()
-                if not name:
-                    fname = view.file_name()
-                    name = os.path.basename(fname) if fname else '<untitled>'
-                names.append(name)
+        assistant_name = (
+            text.get('name')
+            if isinstance(text, dict)
+            else get_model_or_default(self.window.active_view()).name
+        )
+        packed_sheets = BufferContentManager.pack_sheets(sheets, context_token_budget(assistant_name))
 
         # Create a vertical list in HTML format
-        list_items = ''.join(f'<li>{name}</li>' for name in names)
-        return sublime.Html(f'<p>{len(sheets)} file(s) added:</p><ul>{list_items}</ul>')
+        list_items = ''.join(
+            f'<li>{html.escape(packed.source.name)}: {_format_tokens(packed.tokens)}'
+            + (f' ({packed.mode})' if packed.mode != PackedSheet.FULL else '')
+            + '</li>'
+            for _, packed in packed_sheets
+        )
+        total = _format_tokens(sum(packed.tokens for _, packed in packed_sheets))
+        return sublime.Html(f'<p>{len(sheets)} file(s) added, {total}:</p><ul>{list_items}</ul>')
 
     def list_items(self) -> List[Tuple[str, Value]]:
         logger.debug('list_items _name: %s', self._name)
@@ -169,3 +173,7 @@ class AIWholeInputHandler(ListInputHandler):
     def next_input(self, args):
         if self.next_names:
             return AIWholeInputHandler(self.window, self.next_names, args)
+
+
+def _format_tokens(tokens: int) -> str:
+    return f'~{tokens / 1000:.1f}k tokens' if tokens >= 1000 else f'~{tokens} tokens'
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
-from typing import Dict
+from typing import Any, Dict, List
 
-from llm_runner import Roles, read_all_cache  # type: ignore
-from sublime import Settings, View, Window, load_settings
+from llm_runner import Roles  # type: ignore
+from sublime import Region, Settings, View, Window, load_settings
 from sublime_plugin import EventListener
 
+from .history_store import history_store
 from .load_model import get_cache_path
 
+HISTORY_OFFSET_KEY = 'openai_history_offset'
+
 
 class SharedOutputPanelListener(EventListener):
     OUTPUT_PANEL_NAME = 'AI Chat'
@@ -25,6 +28,7 @@ class SharedOutputPanelListener(EventListener):
         self.line_numbers_enabled: bool = self.panel_settings.get('line_numbers_enabled', True)
         self.scroll_past_end: bool = self.panel_settings.get('scroll_past_end', False)
         self.reverse_for_tab: bool = self.panel_settings.get('reverse_for_tab', True)
+        self.history_window: int = self.panel_settings.get('history_window', 20)
         super().__init__()
 
     def create_new_tab(self, window: Window):
@@ -67,35 +71,74 @@ class SharedOutputPanelListener(EventListener):
         view = self.get_output_view_(window=window)
         view.run_command('append', {'characters': text, 'force': True})
 
+    def update_output_view_batch(self, fragments: List[str], window: Window, replace: bool = False) -> View:
+        """Writes all the `fragments` to the output view within a single edit.
+
+        The target view is resolved once, `replace` swaps the whole content of the view instead of appending.
+        """
+        view = self.get_output_view_(window=window)
+        text = ''.join(fragments)
+        if replace:
+            view.set_read_only(False)
+            view.run_command('replace_region', {'region': {'a': 0, 'b': view.size()}, 'text': text})
+            view.set_read_only(True)
+        elif text:
+            view.run_command('append', {'characters': text, 'force': True})
+        return view
+
     def get_output_view_(self, window: Window, reversed: bool = False) -> View:
         view = self.get_active_tab_(window=window) or self.get_output_panel_(window=window)
         view.set_name(self.OUTPUT_PANEL_NAME)
         return view
 
     def refresh_output_panel(self, window: Window):
-        self.clear_output_panel(window)
-
+        """Renders the last `history_window` turns of the chat, older ones are paged in
+        by `load_older_history`"""
         path = get_cache_path(window.active_view())  # type: ignore
 
-        for item in read_all_cache(path):
-            ## TODO: Make me enumerated, e.g. Question 1, Question 2 etc.
-            if item.role == Roles.User:
-                if item.path:
-                    self.update_output_view('\n\n## Selection\n\n', window)
-                    self.update_output_view(f'Path: `{item.path}`', window)
-                    self.update_output_view('\n', window)
-                else:
-                    self.update_output_view('\n\n## Question\n\n', window)
-
-            elif item.role == Roles.Assistant:
-                self.update_output_view('\n\n## Answer\n\n', window)
-            if item.role == Roles.Tool:
-                self.update_output_view('item.tool_call_id', window)
-            else:
-                self.update_output_view(item.content, window)
+        store = history_store(path)
+        turns_count = store.turns_count()
+        offset = 0 if self.history_window < 0 else max(0, turns_count - self.history_window)
+
+        fragments = [older_turns_hint_(offset)]
+        for turn in store.read_turns(offset):
+            fragments += turn_fragments_(turn)
 
+        view = self.update_output_view_batch(fragments, window, replace=True)
+        view.settings().set(HISTORY_OFFSET_KEY, offset)
         self.scroll_to_botton(window=window)
 
+    def load_older_history(self, window: Window):
+        """Prepends the previous `history_window` turns to the chat within a single edit"""
+        view = self.get_output_view_(window=window)
+        offset: int = view.settings().get(HISTORY_OFFSET_KEY, 0)  # type: ignore
+        if offset <= 0:
+            return
+
+        hint = older_turns_hint_(offset)
+        if view.substr(Region(0, len(hint))) != hint:  # the view was changed behind our back
+            self.refresh_output_panel(window=window)
+            return
+
+        path = get_cache_path(window.active_view())  # type: ignore
+
+        new_offset = 0 if self.history_window < 0 else max(0, offset - self.history_window)
+
+        fragments = [older_turns_hint_(new_offset)]
+        for turn in history_store(path).read_turns(new_offset, offset):
+            fragments += turn_fragments_(turn)
+
+        view.set_read_only(False)
+        view.run_command('replace_region', {'region': {'a': 0, 'b': len(hint)}, 'text': ''.join(fragments)})
+        view.set_read_only(True)
+        view.settings().set(HISTORY_OFFSET_KEY, new_offset)
+
+    def on_text_command(self, view: View, command_name: str, args: Dict[str, Any] | None):
+        # Jumping to the very beginning of the chat pages the older turns in
+        if command_name == 'move_to' and args and args.get('to') == 'bof':
+            if view.name() == self.OUTPUT_PANEL_NAME and view.settings().get(HISTORY_OFFSET_KEY, 0):
+                self.load_older_history(window=view.window())  # type: ignore
+
     def clear_output_panel(self, window: Window):
         output_panel = self.get_output_view_(window=window)
         output_panel.set_read_only(False)
@@ -125,6 +168,34 @@ class SharedOutputPanelListener(EventListener):
         window.run_command('show_panel', {'panel': f'output.{self.OUTPUT_PANEL_NAME}'})
 
 
+def turn_fragments_(turn: List[Any]) -> List[str]:
+    fragments: List[str] = []
+    for item in turn:
+        ## TODO: Make me enumerated, e.g. Question 1, Question 2 etc.
+        if item.role == Roles.User:
+            if item.path:
+                fragments += ['\n\n## Selection\n\n', f'Path: `{item.path}`', '\n']
+            else:
+                fragments.append('\n\n## Question\n\n')
+
+        elif item.role == Roles.Assistant:
+            fragments.append('\n\n## Answer\n\n')
+        if item.role == Roles.Tool:
+            fragments.append('item.tool_call_id')
+        else:
+            fragments.append(item.content)
+    return fragments
+
+
+def older_turns_hint_(count: int) -> str:
+    if count <= 0:
+        return ''
+    return (
+        f'_{count} older turn(s) hidden, press `ctrl+home` or run "OpenAI: Load Older Chat History"'
+        ' to show them_\n'
+    )
+
+
 def __get_number_of_lines__(view: View) -> int:
     last_line_num = view.rowcol(view.size())[0]
     return last_line_num
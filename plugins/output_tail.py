@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import re
+from typing import Callable, Dict, List
+
+FIRST_CHUNK = 1 << 14  # characters, doubled on each step back
+
+ERROR_LINE = re.compile(r'\b(error|fatal|panic(ked)?)\b', re.IGNORECASE)
+
+
+def tail_lines(
+    read: Callable[[int, int], str],
+    size: int,
+    limit: int,
+    collapse_repeats: bool = False,
+    errors_only: bool = False,
+) -> List[str]:
+    """Returns the last `limit` lines (all if `limit == -1`) of a text of `size` characters,
+    read by `read(begin, end)`.
+
+    The text is read backwards in growing chunks until enough lines are kept, so the cost follows
+    the amount of lines kept (and skipped by the filters), not the size of the text.
+    With `collapse_repeats` a line seen later in the text is dropped and its kept copy gets a repeat counter,
+    with `errors_only` only the lines mentioning an error are kept.
+    """
+    kept: List[str] = []  # from the last line backwards
+    counts: Dict[str, int] = {}
+    end = size
+    chunk = FIRST_CHUNK
+    partial = ''
+    first_chunk = True
+
+    while end > 0 and (limit == -1 or len(kept) < limit):
+        begin = max(0, end - chunk)
+        lines = (read(begin, end) + partial).split('\n')
+        if first_chunk and lines and lines[-1] == '':
+            lines.pop()  # a trailing line break doesn't start a line
+        first_chunk = False
+        partial = lines.pop(0) if begin > 0 else ''
+        _keep(reversed(lines), kept, counts, limit, collapse_repeats, errors_only)
+        end, chunk = begin, chunk * 2
+
+    if partial and (limit == -1 or len(kept) < limit):
+        _keep([partial], kept, counts, limit, collapse_repeats, errors_only)
+
+    kept.reverse()
+    if collapse_repeats:
+        kept = [f'{line} (repeated {counts[line]} times)' if counts[line] > 1 else line for line in kept]
+    return kept
+
+
+def _keep(
+    lines, kept: List[str], counts: Dict[str, int], limit: int, collapse_repeats: bool, errors_only: bool
+):
+    for line in lines:
+        if errors_only and not ERROR_LINE.search(line):
+            continue
+        if collapse_repeats:
+            if line in counts:
+                counts[line] += 1
+                continue
+            counts[line] = 1
+        if limit != -1 and len(kept) >= limit:
+            return
+        kept.append(line)
@@ -6,7 +6,7 @@ from typing import List
 import re
 
 import mdpopups
-from llm_runner import InputKind, SublimeInputContent, write_to_cache  # type: ignore
+from llm_runner import InputKind, SublimeInputContent  # type: ignore
 from sublime import (
     NewFileFlags,
     Phantom,
@@ -19,24 +19,21 @@ from sublime import (
     set_timeout,
 )
 
+from .history_store import history_store
 from .load_model import get_cache_path
+from .markdown_renderer import IncrementalMarkdownRenderer
 from .output_panel import SharedOutputPanelListener
 from .response_manager import ResponseManager
 from .utils import extract_code_blocks
 
 OPENAI_COMPLETION_KEY = 'openai_completion'
-PHANTOM_TEMPLATE = (
-    '---'
-    + '\nallow_code_wrap: true'
-    + '\n---'
-    + '\n\n<a href="close">[x]</a> \
+PHANTOM_FRONTMATTER = '---' + '\nallow_code_wrap: true' + '\n---' + '\n\n'
+PHANTOM_HEADER = '<a href="close">[x]</a> \
     | <a href="copy">Copy</a> \
     | <a href="append">Append</a> \
     | <a href="replace">Replace</a> \
     | <a href="new_file">In New Tab</a> \
     | <a href="history">Add to History</a>'
-    + '\n\n{streaming_content}'
-)
 CLASS_NAME = 'openai-completion-phantom'
 
 logger = logging.getLogger(__name__)
@@ -56,6 +53,9 @@ class PhantomStreamer:
         self.phantom: Phantom | None = None
         self.phantom_id: int | None = None
         self.user_input = user_input
+        self.hide_thoughts: bool = True
+        self.renderer = IncrementalMarkdownRenderer(self._render_block)
+        self.header_html: str = self._render_block(PHANTOM_HEADER)
         self.is_discardable: bool = (
             load_settings('openAI.sublime-settings')
             .get('chat_presentation', {})
@@ -96,8 +96,14 @@ class PhantomStreamer:
         """Update and show the phantom"""
         line_beginning = self.view.line(self.view.sel()[0].end() if self.selected_region is None else self.selected_region.end())
 
-        content = PHANTOM_TEMPLATE.format(streaming_content=content)
-        html = mdpopups._create_html(self.view, self._preprocess_content(content, hide_thoughts=hide_thoughts), wrapper_class=CLASS_NAME)
+        # Streamed updates come from the async thread and the thoughts toggles from the main one
+        with self.renderer.lock:
+            if hide_thoughts != self.hide_thoughts:
+                self.hide_thoughts = hide_thoughts
+                self.renderer.reset()
+
+            body = self.header_html + self.renderer.render(content)
+        html = mdpopups._create_html(self.view, body, md=False, wrapper_class=CLASS_NAME)
 
         phantom = (
             self.phantom
@@ -145,14 +151,15 @@ class PhantomStreamer:
 
                 listner = SharedOutputPanelListener()
 
-                ResponseManager.print_requests(listner, window, self.user_input)
-
-                ResponseManager.prepare_to_response(listner, window)
-                ResponseManager.update_output_panel_(listner, window, assitant_content.content)
+                ResponseManager.prepare_to_response(
+                    listner, window, self.user_input, assitant_content.content
+                )
 
                 self.user_input.append(assitant_content)
 
-                [write_to_cache(path, item) for item in self.user_input if item.input_kind != InputKind.Sheet]
+                history_store(path).append(
+                    [item for item in self.user_input if item.input_kind != InputKind.Sheet]
+                )
 
             elif attribute == PhantomActions.close.value:
                 pass
@@ -169,6 +176,11 @@ class PhantomStreamer:
         else:  # for handling all the rest URLs
             (self.view.window() or active_window()).run_command('open_url', {'url': attribute})
 
+    def _render_block(self, block: str) -> str:
+        """Converts a single markdown block of the completion into html"""
+        content = PHANTOM_FRONTMATTER + self._preprocess_content(block, hide_thoughts=self.hide_thoughts)
+        return mdpopups.md2html(self.view, content)
+
     def _preprocess_content(self, content, hide_thoughts=True) -> str:
         """Pre-compile the content to show in the phantom
         
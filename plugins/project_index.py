@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Tuple
+
+from .project_structure import IGNORE_SOURCES, ignore_checker
+
+logger = logging.getLogger(__name__)
+
+VALIDATION_INTERVAL = 5.0  # seconds between two directory mtime sweeps
+
+
+class DirectoryEntry:
+    __slots__ = ('mtime', 'dirs', 'files', 'ignored')
+
+    def __init__(
+        self,
+        mtime: float,
+        dirs: List[str],
+        files: Dict[str, Tuple[int, float]],
+        ignored: List[str],
+    ) -> None:
+        self.mtime = mtime
+        self.dirs = dirs
+        self.files = files  # name -> (size, mtime), sorted by name
+        self.ignored = ignored
+
+
+class ProjectIndex:
+    """In-memory index of a project folder: visible paths with their sizes and mtimes.
+
+    The index is built once (usually in a background thread), then kept up to date
+    by `update_file` calls on file events and by directory mtime sweeps in `validate`,
+    which run at most once per `VALIDATION_INTERVAL` when the index is queried.
+    A changed `.gitignore` re-indexes its folder tree, a changed `.git/info/exclude` the whole index.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = os.path.normpath(root)
+        self.checker = ignore_checker(self.root)
+        self.directories: Dict[str, DirectoryEntry] = {}
+        self.ready = threading.Event()
+        self.validated_at: float = 0.0
+        self.exclude_mtime: float = 0.0
+        self._lock = threading.RLock()
+
+    def build(self):
+        with self._lock:
+            start = time.perf_counter()
+            self.directories = {}
+            self.checker.forget(self.root)
+            self.exclude_mtime = self._exclude_mtime()
+            self._index_tree(self.root)
+            self.validated_at = time.monotonic()
+            self.ready.set()
+            logger.debug(
+                'indexed %s: %d directories in %.3fs',
+                self.root,
+                len(self.directories),
+                time.perf_counter() - start,
+            )
+
+    def contains(self, path: str) -> bool:
+        path = os.path.normpath(path)
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def walk(self, path: str, max_depth: int | None = None) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """Like `IgnoreChecker.walk`, but served from memory."""
+        self.validate_if_stale()
+        return self._walk(os.path.normpath(path), max_depth)
+
+    def _walk(self, path: str, max_depth: int | None) -> Iterator[Tuple[str, List[str], List[str]]]:
+        entry = self.directories.get(path)
+        if entry is None:
+            return
+        yield path, entry.dirs, list(entry.files)
+        if max_depth is not None and max_depth <= 1:
+            return
+        for name in entry.dirs:
+            yield from self._walk(os.path.join(path, name), None if max_depth is None else max_depth - 1)
+
+    def file_info(self, path: str) -> Tuple[int, float] | None:
+        """Returns (size, mtime) of an indexed file."""
+        path = os.path.normpath(path)
+        entry = self.directories.get(os.path.dirname(path))
+        return entry.files.get(os.path.basename(path)) if entry else None
+
+    def update_file(self, path: str):
+        """Updates the index for a created or modified file."""
+        path = os.path.normpath(path)
+        parent, name = os.path.split(path)
+        if path == os.path.join(self.checker.base_path, IGNORE_SOURCES[1]):
+            self.build()  # the exclude file of the repository applies to all of it
+            return
+        with self._lock:
+            if name == IGNORE_SOURCES[0] and parent in self.directories:
+                self._reindex_ignores(parent)
+                return
+            entry = self.directories.get(parent)
+            if entry is not None and name in entry.ignored:
+                return
+            if entry is None or name not in entry.files:
+                # A new file (or a new directory) changes the listing of its first indexed ancestor
+                while parent not in self.directories and self.contains(parent) and parent != self.root:
+                    parent = os.path.dirname(parent)
+                if parent in self.directories:
+                    self._reindex(parent)
+                return
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self._reindex(parent)
+                return
+            entry.files[name] = (stat.st_size, stat.st_mtime)
+
+    def validate_if_stale(self):
+        if time.monotonic() - self.validated_at > VALIDATION_INTERVAL:
+            self.validate()
+
+    def validate(self):
+        """Re-lists every directory whose mtime has changed since it was indexed."""
+        with self._lock:
+            if self._exclude_mtime() != self.exclude_mtime:
+                self.build()
+                return
+            self.validated_at = time.monotonic()
+            for path, entry in list(self.directories.items()):
+                if path not in self.directories:
+                    continue  # dropped along with its changed parent
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    mtime = None
+                if mtime != entry.mtime:
+                    self._reindex(path)
+                elif IGNORE_SOURCES[0] in entry.files:
+                    # Saving a .gitignore in place doesn't change the mtime of its folder
+                    ignore_info = entry.files[IGNORE_SOURCES[0]]
+                    try:
+                        stat = os.stat(os.path.join(path, IGNORE_SOURCES[0]))
+                    except OSError:
+                        continue
+                    if (stat.st_size, stat.st_mtime) != ignore_info:
+                        self._reindex_ignores(path)
+
+    def _reindex_ignores(self, path: str):
+        """Indexes the `path` tree anew, after an ignore file affecting all of it has changed"""
+        self.checker.forget(path)
+        self._drop_tree(path)
+        self._index_tree(path)
+
+    def _exclude_mtime(self) -> float:
+        try:
+            return os.stat(os.path.join(self.checker.base_path, IGNORE_SOURCES[1])).st_mtime
+        except OSError:
+            return 0.0
+
+    def _reindex(self, path: str):
+        old = self.directories.get(path)
+        if not os.path.isdir(path):
+            self._drop_tree(path)
+            return
+        entry = self._index_dir(path)
+        for name in old.dirs if old else []:
+            if name not in entry.dirs:
+                self._drop_tree(os.path.join(path, name))
+        for name in entry.dirs:
+            child = os.path.join(path, name)
+            if child not in self.directories:
+                self._index_tree(child)
+
+    def _index_tree(self, path: str):
+        entry = self._index_dir(path)
+        for name in entry.dirs:
+            child = os.path.join(path, name)
+            if not os.path.islink(child):  # same as os.walk, symlinked directories aren't followed
+                self._index_tree(child)
+
+    def _index_dir(self, path: str) -> DirectoryEntry:
+        try:
+            mtime = os.stat(path).st_mtime
+            dirs, files, ignored = self.checker.scan_dir(path)
+        except OSError as error:
+            logger.debug('failed to index %s: %s', path, error)
+            mtime, dirs, files, ignored = 0.0, [], [], []
+
+        file_infos: Dict[str, Tuple[int, float]] = {}
+        for name in files:
+            try:
+                stat = os.stat(os.path.join(path, name))
+                file_infos[name] = (stat.st_size, stat.st_mtime)
+            except OSError:
+                continue
+
+        entry = self.directories[path] = DirectoryEntry(mtime, dirs, file_infos, ignored)
+        return entry
+
+    def _drop_tree(self, path: str):
+        prefix = path + os.sep
+        for key in [key for key in self.directories if key == path or key.startswith(prefix)]:
+            del self.directories[key]
+
+
+_indexes: Dict[str, ProjectIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def ensure_project_index(root: str) -> ProjectIndex:
+    """Returns the index of the `root` folder, building it in a background thread on the first call."""
+    root = os.path.normpath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is not None:
+            return index
+        index = _indexes[root] = ProjectIndex(root)
+    threading.Thread(target=index.build, name=f'project index: {root}', daemon=True).start()
+    return index
+
+
+def find_project_index(path: str) -> ProjectIndex | None:
+    """Returns a built index which covers the `path`, if any."""
+    for index in list(_indexes.values()):
+        if index.ready.is_set() and index.contains(path):
+            return index
+    return None
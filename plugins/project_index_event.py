@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import logging
+
+import sublime
+from sublime import View, Window
+from sublime_plugin import EventListener
+
+from .project_index import ensure_project_index, find_project_index
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectIndexListener(EventListener):
+    def on_activated_async(self, view: View):
+        window = view.window()
+        if window:
+            self.index_window_folders(window)
+
+    def on_load_project_async(self, window: Window):
+        self.index_window_folders(window)
+
+    def on_post_save_async(self, view: View):
+        path = view.file_name()
+        if not path:
+            return
+        index = find_project_index(path)
+        if index:
+            logger.debug('updating project index for %s', path)
+            index.update_file(path)
+
+    def index_window_folders(self, window: Window):
+        settings = sublime.load_settings('openAI.sublime-settings')
+        if not settings.get('project_index', True):
+            return
+        for folder in window.folders():
+            index = ensure_project_index(folder)
+            if index.ready.is_set():
+                index.validate_if_stale()
@@ -1,36 +1,260 @@
+import atexit
 import json
+import logging
 import os
 import subprocess
-from typing import List, Set
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
+logger = logging.getLogger(__name__)
 
-def get_ignored_files(relative_paths: List[str], base_path: str) -> Set[str]:
+IGNORE_SOURCES = ('.gitignore', os.path.join('.git', 'info', 'exclude'))
+
+
+class IgnoreChecker:
     """
-    Runs git check-ignore in batch for the given relative paths.
-    Returns a set of relative paths that are ignored.
+    Keeps a single `git check-ignore --stdin` process per repository root and caches
+    directory listings with their ignore status keyed on the directory mtime.
+    Any change of the root ignore files drops the whole cache and restarts the process,
+    a change of a nested `.gitignore` drops the listings of its folder and below it.
     """
-    if not relative_paths:
-        return set()
 
-    # Run git check-ignore on all files in one call.
-    cmd = ['git', 'check-ignore'] + relative_paths
+    def __init__(self, base_path: str):
+        self.base_path = base_path
+        self._process: Optional[subprocess.Popen] = None
+        self._is_repository = True
+        self._lock = threading.Lock()
+        self._listings: Dict[str, Tuple[float, List[str], List[str], List[str]]] = {}
+        self._sources_mtime: Tuple[float, ...] = ()
+        self._nested_sources: Dict[str, float] = {}  # scanned folder: mtime of its .gitignore, 0 if none
+
+    def ignored(self, relative_paths: List[str]) -> Set[str]:
+        """Returns a set of relative paths that are ignored."""
+        if not relative_paths:
+            return set()
+
+        with self._lock:
+            process = self._ensure_process()
+            if not process:
+                return set()
+            try:
+                return self._query(process, relative_paths)
+            except (OSError, ValueError) as error:
+                logger.debug('git check-ignore failed in %s: %s', self.base_path, error)
+                try:
+                    # git exits with 128 outside of a repository, there's no point to respawn it then
+                    self._is_repository = process.wait(timeout=1) != 128
+                except subprocess.TimeoutExpired:
+                    pass
+                self._kill()
+                return set()
+
+    def list_dir(self, path: str) -> Tuple[List[str], List[str]]:
+        """Returns sorted visible (dirs, files) of the `path` directory, `.git` is always skipped."""
+        dirs, files, _ = self.scan_dir(path)
+        return dirs, files
+
+    def scan_dir(self, path: str) -> Tuple[List[str], List[str], List[str]]:
+        """Returns sorted visible (dirs, files) of the `path` directory along with the ignored names."""
+        self._check_sources(path)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return [], [], []
+
+        cached = self._listings.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1], cached[2], cached[3]
+
+        dirs: List[str] = []
+        files: List[str] = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name == '.git':
+                        continue
+                    (dirs if entry.is_dir() else files).append(entry.name)
+        except OSError as error:  # same as os.walk, an unreadable directory is skipped
+            logger.debug('failed to list %s: %s', path, error)
+            return [], [], []
+
+        has_ignore_file = '.gitignore' in files
+        self._nested_sources[path] = _mtime(os.path.join(path, '.gitignore')) if has_ignore_file else 0.0
+        rel_paths = {name: os.path.relpath(os.path.join(path, name), self.base_path) for name in dirs + files}
+        ignored = self.ignored(list(rel_paths.values()))
+        ignored_names = sorted(name for name, rel_path in rel_paths.items() if rel_path in ignored)
+        dirs = sorted(name for name in dirs if rel_paths[name] not in ignored)
+        files = sorted(name for name in files if rel_paths[name] not in ignored)
+
+        self._listings[path] = (mtime, dirs, files, ignored_names)
+        return dirs, files, ignored_names
+
+    def walk(self, path: str, max_depth: Optional[int] = None) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """
+        Like `os.walk`, but ignored directories are pruned before descending into them.
+        max_depth: the number of directory levels to list, the `path` itself is the first one.
+        """
+        dirs, files = self.list_dir(path)
+        yield path, dirs, files
+        if max_depth is not None and max_depth <= 1:
+            return
+        for name in dirs:
+            child = os.path.join(path, name)
+            if not os.path.islink(child):  # same as os.walk, symlinked directories aren't followed
+                yield from self.walk(child, None if max_depth is None else max_depth - 1)
+
+    def forget(self, path: str):
+        """Drops the cached listings of `path` and below it, for when an ignore file has changed"""
+        for key in [key for key in list(self._listings) if _is_within(key, path)]:
+            self._listings.pop(key, None)
+        self.close()  # git keeps serving the ignore files it has already read
+
+    def close(self):
+        with self._lock:
+            self._kill()
+
+    def _check_sources(self, path: str):
+        sources_mtime = tuple(_mtime(os.path.join(self.base_path, source)) for source in IGNORE_SOURCES)
+        if sources_mtime != self._sources_mtime:
+            self._sources_mtime = sources_mtime
+            self._listings.clear()
+            self._nested_sources.clear()
+            self.close()
+            return
+
+        # Only the .gitignore files of `path` and the folders above it affect its listing
+        folder = path
+        while True:
+            known = self._nested_sources.get(folder)
+            if known is not None:
+                mtime = _mtime(os.path.join(folder, '.gitignore'))
+                if mtime != known:
+                    self._nested_sources[folder] = mtime
+                    self.forget(folder)
+            parent = os.path.dirname(folder)
+            if folder == self.base_path or parent == folder:
+                break
+            folder = parent
+
+    def _ensure_process(self) -> Optional[subprocess.Popen]:
+        if self._process and self._process.poll() is None:
+            return self._process
+        if not self._is_repository:
+            return None
+        try:
+            self._process = subprocess.Popen(
+                ['git', 'check-ignore', '--stdin', '-z', '--non-matching', '--verbose'],
+                cwd=self.base_path,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        except Exception:
+            self._process = None
+        return self._process
+
+    def _query(self, process: subprocess.Popen, relative_paths: List[str]) -> Set[str]:
+        # Writing happens aside so the git output pipe can't fill up and block both ends
+        payload = b''.join(os.fsencode(path) + b'\0' for path in relative_paths)
+        writer = threading.Thread(target=_write, args=(process, payload), daemon=True)
+        writer.start()
+
+        # Each path is answered with 4 fields: <source> <linenum> <pattern> <pathname>
+        expected = len(relative_paths) * 4
+        fields: List[bytes] = []
+        buffer = b''
+        fd = process.stdout.fileno()  # type: ignore
+        while len(fields) < expected:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise ValueError('git check-ignore exited unexpectedly')
+            *complete, buffer = (buffer + chunk).split(b'\0')
+            fields.extend(complete)
+        writer.join()
+
+        ignored = set()
+        for i in range(0, expected, 4):
+            # Non-matching paths come with an empty source, re-included ones with a `!pattern`
+            if fields[i] and not fields[i + 2].startswith(b'!'):
+                ignored.add(os.fsdecode(fields[i + 3]))
+        return ignored
+
+    def _kill(self):
+        if self._process:
+            self._process.kill()
+            self._process = None
+
+
+def _write(process: subprocess.Popen, payload: bytes):
     try:
-        result = subprocess.run(
-            cmd,
-            cwd=base_path,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-    except Exception:
-        return set()
-
-    ignored = set()
-    if result.stdout:
-        # Each line corresponds to a file that is ignored.
-        for line in result.stdout.splitlines():
-            ignored.add(line.strip())
-    return ignored
+        process.stdin.write(payload)  # type: ignore
+        process.stdin.flush()  # type: ignore
+    except OSError:
+        pass
+
+
+def _is_within(path: str, folder: str) -> bool:
+    return path == folder or path.startswith(os.path.join(folder, ''))
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+_checkers: Dict[str, IgnoreChecker] = {}
+_roots: Dict[str, str] = {}
+
+
+def repository_root(path: str) -> str:
+    """Returns the closest folder containing `path` with a `.git` in it, or `path` itself if there's none"""
+    path = os.path.abspath(path)
+    root = _roots.get(path)
+    if root is None:
+        root = path
+        current = path
+        while True:
+            if os.path.exists(os.path.join(current, '.git')):
+                root = current
+                break
+            parent = os.path.dirname(current)
+            if parent == current:
+                break
+            current = parent
+        _roots[path] = root
+    return root
+
+
+def ignore_checker(path: str) -> IgnoreChecker:
+    """Returns the checker of the repository `path` belongs to, shared by all of its folders"""
+    root = repository_root(path)
+    checker = _checkers.get(root)
+    if checker is None:
+        checker = _checkers[root] = IgnoreChecker(root)
+    return checker
+
+
+@atexit.register
+def close_ignore_checkers():
+    for checker in _checkers.values():
+        checker.close()
+    _checkers.clear()
+
+
+def get_ignored_files(relative_paths: List[str], base_path: str) -> Set[str]:
+    """
+    Checks the given paths relative to base_path against the long-lived git check-ignore
+    of its repository. Returns a set of the given relative paths that are ignored.
+    """
+    checker = ignore_checker(base_path)
+    base_path = os.path.abspath(base_path)
+    root_paths = {
+        os.path.relpath(os.path.join(base_path, path), checker.base_path): path for path in relative_paths
+    }
+    ignored = checker.ignored(list(root_paths))
+    return {path for root_path, path in root_paths.items() if root_path in ignored}
 
 
 def build_folder_structure_(path: str, base_path: str) -> dict:
@@ -41,29 +265,14 @@ def build_folder_structure_(path: str, base_path: str) -> dict:
     """
     folder_structure = {'name': os.path.basename(path), 'children': []}
     try:
-        items = os.listdir(path)
-        if not items:
-            return folder_structure
-
-        # Explicitly exclude the '.git' folder.
-        if '.git' in items:
-            items.remove('.git')
-
-        # Create a mapping from item to its relative path from base_path.
-        rel_paths = {item: os.path.relpath(os.path.join(path, item), base_path) for item in items}
-
-        # Get the set of ignored relative paths for the current directory.
-        ignored = get_ignored_files(list(rel_paths.values()), base_path)
-
-        for item in items:
-            if rel_paths[item] in ignored:
-                continue
+        if not os.access(path, os.R_OK | os.X_OK):
+            raise PermissionError(path)  # the checker lists an unreadable folder as empty
+        dirs, files = ignore_checker(base_path).list_dir(path)
 
-            item_path = os.path.join(path, item)
-            if os.path.isdir(item_path):
-                folder_structure['children'].append(build_folder_structure_(item_path, base_path))
-            else:
-                folder_structure['children'].append({'name': item, 'children': []})
+        for item in dirs:
+            folder_structure['children'].append(build_folder_structure_(os.path.join(path, item), base_path))
+        for item in files:
+            folder_structure['children'].append({'name': item, 'children': []})
     except PermissionError:
         folder_structure['children'].append({'name': 'Access Denied', 'children': []})
     return folder_structure
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, List
+
+from .context_packer import estimate_tokens
+
+_previous: Dict[str, List[str]] = {}  # cache path -> content hashes of the previous request items
+
+
+def reusable_prefix_tokens(cache_path: str, contents: List[str]) -> int:
+    """Estimates the tokens of the leading request items identical to the previous request of the same chat.
+
+    That's the part of the new input a provider side prompt cache can serve,
+    given the system prompt and the history before it haven't changed either.
+    """
+    hashes = [hashlib.sha1(content.encode('utf-8')).hexdigest() for content in contents]
+    previous = _previous.get(cache_path, [])
+    _previous[cache_path] = hashes
+
+    tokens = 0
+    for digest, previous_digest, content in zip(hashes, previous, contents):
+        if digest != previous_digest:
+            break
+        tokens += estimate_tokens(content)
+    return tokens
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT = 4
+DEFAULT_MAX_CONCURRENT_PER_PROVIDER = 2
+TIMINGS_KEPT = 50
+
+_request_ids = itertools.count(1)
+
+
+class ActiveRequest:
+    """A request run by `worker`, its streamed chunks pass through the handler returned by `wrap`."""
+
+    __slots__ = (
+        'id',
+        'window_id',
+        'view_id',
+        'provider',
+        'worker',
+        'label',
+        'path',
+        'output',
+        'started',
+        'chunks',
+        'cancelled_at',
+        'on_cancel',
+        '_gate',
+    )
+
+    def __init__(
+        self,
+        window_id: int,
+        view_id: int,
+        url: str | None,
+        worker: Any,
+        label: str,
+        on_cancel: Callable[[str], None] | None = None,
+        path: str | None = None,
+        output: Hashable | None = None,
+    ) -> None:
+        self.id = next(_request_ids)
+        self.window_id = window_id
+        self.view_id = view_id
+        self.provider = provider_of(url)  # endpoint host
+        self.worker = worker
+        self.label = label
+        self.path = path  # cache path of the chat the response is written to, if any
+        self.output = output  # key of the response's output in the update scheduler
+        self.started = time.monotonic()
+        self.chunks: List[str] = []
+        self.cancelled_at: float | None = None
+        self.on_cancel = on_cancel  # receives the text streamed before the request was cancelled
+        self._gate = threading.Lock()
+
+    def wrap(self, handler: Callable[[str], None]) -> Callable[[str], None]:
+        """Returns `handler` collecting the streamed text and dropping whatever arrives after `cancel`"""
+
+        def gated_handler(content: str) -> None:
+            with self._gate:
+                if self.cancelled_at is not None:
+                    return
+                self.chunks.append(content)
+                handler(content)
+
+        return gated_handler
+
+    def cancel(self):
+        """Stops passing chunks to the handler, once it returns none is being handled either"""
+        with self._gate:
+            if self.cancelled_at is None:
+                self.cancelled_at = time.perf_counter()
+
+    @property
+    def partial(self) -> str:
+        return ''.join(self.chunks)
+
+
+class RequestRegistry:
+    """In-flight requests of all the windows, each one with its own worker.
+
+    Starting a request is limited to `max_concurrent` requests at once overall,
+    to `max_concurrent_per_provider` at once to the same endpoint host and to one at once
+    writing to the same chat, which has a single output panel and history.
+    Requests whose workers have finished are dropped whenever the registry is queried.
+
+    The windows with running requests are kept up to date by `add` and `remove`, so
+    `is_running` is a dictionary lookup, cheap enough for the key binding context.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+        max_concurrent_per_provider: int = DEFAULT_MAX_CONCURRENT_PER_PROVIDER,
+    ) -> None:
+        self.max_concurrent = max_concurrent
+        self.max_concurrent_per_provider = max_concurrent_per_provider
+        self._requests: Dict[int, ActiveRequest] = {}
+        self._windows: Dict[int, int] = {}  # window id: running requests, read without the lock
+        self._cancel_timings: Deque[Tuple[float, float | None]] = deque(maxlen=TIMINGS_KEPT)
+        self._lock = threading.Lock()
+
+    def can_start(self, url: str | None, path: str | None = None) -> Tuple[bool, str]:
+        """Returns whether one more request to `url` (writing to the chat at `path`) fits the caps,
+        and the reason if it doesn't"""
+        running = self.running()
+        if path is not None and any(request.path == path for request in running):
+            return False, 'A request of this chat is already running, wait for it or cancel it.'
+        if len(running) >= self.max_concurrent:
+            return False, f'{len(running)} requests are already running, wait for one or cancel it.'
+        provider = provider_of(url)
+        same_provider = [request for request in running if request.provider == provider]
+        if len(same_provider) >= self.max_concurrent_per_provider:
+            return False, (
+                f'{len(same_provider)} requests to {provider} are already running, wait for one or cancel it.'
+            )
+        return True, ''
+
+    def add(self, request: ActiveRequest) -> ActiveRequest:
+        with self._lock:
+            self._finish(request.worker)  # a reused worker is done with its previous request
+            self._requests[request.id] = request
+            self._windows[request.window_id] = self._windows.get(request.window_id, 0) + 1
+        logger.debug('request %s started in window %s', request.id, request.window_id)
+        return request
+
+    def remove(self, request: ActiveRequest):
+        with self._lock:
+            self._discard(request)
+
+    def finish(self, worker: Any):
+        """Drops the request run by `worker`, for when it's known to be over (e.g. failed)"""
+        with self._lock:
+            self._finish(worker)
+
+    def poll(self, request: ActiveRequest) -> bool:
+        """Drops `request` if its worker is done, returns whether it's still running"""
+        if request.id not in self._requests:
+            return False
+        if _is_alive(request):
+            return True
+        self.remove(request)
+        return False
+
+    def is_running(self, window_id: int | None = None) -> bool:
+        """Returns whether any request (of the window) is running, without asking the workers"""
+        return bool(self._windows) if window_id is None else window_id in self._windows
+
+    def record_cancel(self, quiet: float, stopped: float | None):
+        """Records the seconds from a cancel to the last UI update and to the worker being stopped"""
+        with self._lock:
+            self._cancel_timings.append((quiet, stopped))
+        logger.debug(
+            'cancelled: quiet after %.1f ms, stream stopped after %s',
+            quiet * 1000,
+            'n/a' if stopped is None else f'{stopped * 1000:.1f} ms',
+        )
+
+    def cancel_stats(self) -> Dict[str, float]:
+        with self._lock:
+            timings = list(self._cancel_timings)
+        result: Dict[str, float] = {'cancelled': len(timings)}
+        if timings:
+            result['quiet_ms'] = statistics.median(quiet for quiet, _ in timings) * 1000
+            stopped = [value for _, value in timings if value is not None]
+            if stopped:
+                result['stopped_ms'] = statistics.median(stopped) * 1000
+        return result
+
+    def running(self, window_id: int | None = None, view_id: int | None = None) -> List[ActiveRequest]:
+        """Returns the in-flight requests, optionally only those of a window or started from a view"""
+        with self._lock:
+            for request in [request for request in self._requests.values() if not _is_alive(request)]:
+                self._discard(request)
+            return [
+                request
+                for request in self._requests.values()
+                if (window_id is None or request.window_id == window_id)
+                and (view_id is None or request.view_id == view_id)
+            ]
+
+    def _finish(self, worker: Any):
+        for request in [request for request in self._requests.values() if request.worker is worker]:
+            self._discard(request)
+
+    def _discard(self, request: ActiveRequest):
+        if self._requests.pop(request.id, None) is None:
+            return
+        count = self._windows.get(request.window_id, 0) - 1
+        if count > 0:
+            self._windows[request.window_id] = count
+        else:
+            self._windows.pop(request.window_id, None)
+
+
+def provider_of(url: str | None) -> str:
+    return (urlsplit(url).hostname or url) if url else ''
+
+
+def _is_alive(request: ActiveRequest) -> bool:
+    try:
+        return bool(request.worker.is_alive())
+    except Exception:
+        return False
+
+
+request_registry = RequestRegistry()
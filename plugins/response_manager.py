@@ -10,30 +10,31 @@ from .output_panel import SharedOutputPanelListener
 
 class ResponseManager:
     @staticmethod
-    def print_requests(
-        listner: SharedOutputPanelListener,
-        window: Window,
-        content: List[SublimeInputContent],
-    ):
+    def requests_fragments(content: List[SublimeInputContent]) -> List[str]:
+        fragments: List[str] = []
         for item in content:
             if item.path:
                 if item.input_kind == InputKind.ViewSelection:
-                    ResponseManager.update_output_panel_(listner, window, '\n\n## Selection\n\n')
-                    ResponseManager.update_output_panel_(listner, window, f'Path: `{item.path}`')
-                    ResponseManager.update_output_panel_(listner, window, '\n')
+                    fragments += ['\n\n## Selection\n\n', f'Path: `{item.path}`', '\n']
                 elif item.input_kind == InputKind.Sheet:
                     continue
             else:
-                ResponseManager.update_output_panel_(listner, window, '\n\n## Question\n\n')
+                fragments.append('\n\n## Question\n\n')
 
-            ResponseManager.update_output_panel_(listner, window, item.content)
+            fragments.append(item.content)
+        return fragments
 
     @staticmethod
     def prepare_to_response(
         listner: SharedOutputPanelListener,
         window: Window,
+        requests: List[SublimeInputContent] | None = None,
+        answer: str = '',
     ):
-        ResponseManager.update_output_panel_(listner, window, '\n\n## Answer\n\n')
+        """Prints the `requests` (if any) followed by the answer header and the `answer` in a single edit"""
+        fragments = ResponseManager.requests_fragments(requests or [])
+        fragments += ['\n\n## Answer\n\n', answer]
+        listner.update_output_view_batch(fragments, window)
         listner.show_panel(window=window)
         listner.scroll_to_botton(window=window)
 
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+from difflib import unified_diff
+from typing import Any, Dict, Tuple
+
+from .history_store import history_store
+
+logger = logging.getLogger(__name__)
+
+SHEETS_DIR = 'sent_sheets'
+INDEX_FILE = 'index.json'
+
+MAX_DIFF_RATIO = 0.5  # a diff longer than this share of the sheet is not worth it, the sheet is sent whole
+
+
+class SentSheets:
+    """Remembers which sheet contents were sent within the chat stored at `cache_path`.
+
+    Each sheet is kept with the hash of its content and the turn it was sent in, so a later
+    turn can send just a diff against it, or nothing at all if it hasn't changed. A sheet counts
+    as seen by the model only once its turn is in the history and still holds the sheet, so
+    a cancelled request, a history reset or a history without sheets makes it sent whole again.
+    """
+
+    def __init__(self, cache_path: str) -> None:
+        self.cache_path = cache_path
+        self.directory = os.path.join(cache_path, SHEETS_DIR)
+        self.index_path = os.path.join(self.directory, INDEX_FILE)
+        self.index: Dict[str, Dict[str, Any]] = self._load_index()
+
+    def delta(self, path: str, text: str) -> Tuple[int, str | None] | None:
+        """Returns (1-based turn the sheet was sent in, diff since then or None if unchanged),
+        or None if the sheet has to be sent whole. Remembers `text` as sent in the current turn."""
+        turn = history_store(self.cache_path).turns_count()
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        entry = self.index.get(path)
+        if entry and entry['turn'] == turn and entry['hash'] == digest:
+            return None  # the same turn is being sent again
+
+        if entry and entry['turn'] < turn and self._in_history(path, entry['turn']):
+            if entry['hash'] == digest:
+                return entry['turn'] + 1, None
+            previous = self._read_content(entry)
+            if previous is not None:
+                diff = ''.join(
+                    f'{line}\n'
+                    for line in unified_diff(
+                        previous.split('\n'),
+                        text.split('\n'),
+                        f'a/{os.path.basename(path)}',
+                        f'b/{os.path.basename(path)}',
+                        lineterm='',
+                    )
+                )
+                if len(diff) <= MAX_DIFF_RATIO * len(text):
+                    sent_turn = entry['turn'] + 1
+                    self._remember(path, text, digest, turn)
+                    return sent_turn, diff
+
+        self._remember(path, text, digest, turn)
+        return None
+
+    def drop(self):
+        self.index = {}
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _remember(self, path: str, text: str, digest: str, turn: int):
+        file_name = hashlib.sha1(path.encode('utf-8')).hexdigest() + '.txt'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, file_name), 'w', encoding='utf-8') as file:
+                file.write(text)
+            self.index[path] = {'hash': digest, 'turn': turn, 'file': file_name}
+            with open(self.index_path, 'w', encoding='utf-8') as file:
+                json.dump(self.index, file)
+        except OSError as error:
+            logger.warning('Failed to remember the sent sheet %s: %s', path, error)
+            self.index.pop(path, None)
+
+    def _in_history(self, path: str, turn: int) -> bool:
+        """Whether the 0-based `turn` of the history holds the sheet at `path`"""
+        items = history_store(self.cache_path).read_turn(turn)
+        return any(getattr(item, 'path', None) == path for item in items)
+
+    def _read_content(self, entry: Dict[str, Any]) -> str | None:
+        try:
+            with open(os.path.join(self.directory, entry['file']), 'r', encoding='utf-8') as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+
+_sent_sheets: Dict[str, SentSheets] = {}
+
+
+def sent_sheets(cache_path: str) -> SentSheets:
+    """Returns the sent sheets registry of the chat stored at `cache_path`"""
+    registry = _sent_sheets.get(cache_path)
+    if registry is None:
+        registry = _sent_sheets[cache_path] = SentSheets(cache_path)
+    return registry
@@ -6,3 +6,4 @@ class StatusBarMode(Enum):
     output_mode = 'output_mode'
     chat_model = 'chat_model'
     sheets = 'sheets'
+    prompt_cache = 'prompt_cache'
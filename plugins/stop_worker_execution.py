@@ -1,9 +1,13 @@
+from __future__ import annotations
+
 import logging
+import time
 
 from sublime import Edit
-from sublime_plugin import TextCommand
+from sublime_plugin import TextCommand, WindowCommand
 
 from .openai_base import CommonMethods
+from .request_registry import request_registry
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +15,31 @@ logger = logging.getLogger(__name__)
 class StopOpenaiExecutionCommand(TextCommand):
     def run(self, edit: Edit):
         logger.debug('Stop execution call')
-        if CommonMethods.worker and CommonMethods.is_worker_alive():
+        if CommonMethods.is_worker_alive(self.view):
             logger.debug('working_thread and is_alive == true')
-            CommonMethods.stop_worker()
+            CommonMethods.stop_worker(self.view)
+
+
+class OpenaiCancelRequestCommand(WindowCommand):
+    """Lists the running requests of all the windows and cancels the picked one."""
+
+    def run(self):
+        requests = request_registry.running()
+        if not requests:
+            self.window.status_message('No OpenAI requests are running')
+            return
+
+        now = time.monotonic()
+        items = [
+            [
+                request.label,
+                f'window {request.window_id}, {request.provider}, running for {now - request.started:.0f}s',
+            ]
+            for request in requests
+        ]
+
+        def on_select(index: int):
+            if index >= 0:
+                CommonMethods.cancel_request(requests[index])
+
+        self.window.show_quick_panel(items, on_select)
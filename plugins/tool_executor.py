@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator
+
+from sublime import Window
+
+from .function_handler import Function, FunctionHandler, touched_paths
+
+logger = logging.getLogger(__name__)
+
+READ_ONLY_FUNCTIONS = {Function.read_region_content.value, Function.get_working_directory_content.value}
+
+
+class _PathLock:
+    __slots__ = ('lock', 'users')
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.users = 0  # calls holding or waiting for the lock
+
+
+_path_locks: Dict[str, _PathLock] = {}  # only the paths currently in use
+_path_locks_lock = threading.Lock()
+
+
+class ToolExecutor:
+    """Runs the tool calls of a window, one call at a time as the worker hands them over.
+
+    Calls which change files hold a lock per touched path, so writes to the same file never
+    interleave, whichever window or thread the calls come from. Read-only calls take no lock.
+    """
+
+    def __init__(self, window: Window) -> None:
+        self.window = window
+
+    def run(self, name: str, args: str) -> str:
+        if name in READ_ONLY_FUNCTIONS:
+            return FunctionHandler.perform_function(name, args, self.window)
+
+        with ExitStack() as stack:
+            # Always taken in the same order, so two calls can't deadlock on each other's paths
+            for path in sorted(set(touched_paths(name, args, self.window))):
+                stack.enter_context(_path_lock(path))
+            return FunctionHandler.perform_function(name, args, self.window)
+
+
+@contextmanager
+def _path_lock(path: str) -> Iterator[None]:
+    """Holds the lock of `path`, which is dropped once no call uses it anymore"""
+    with _path_locks_lock:
+        entry = _path_locks.get(path)
+        if entry is None:
+            entry = _path_locks[path] = _PathLock()
+        entry.users += 1
+    try:
+        with entry.lock:
+            yield
+    finally:
+        with _path_locks_lock:
+            entry.users -= 1
+            if not entry.users:
+                del _path_locks[path]
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, List
+
+from sublime import set_timeout_async
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_MS = 33
+IDLE_TARGET_TIMEOUT = 60  # seconds after the last flush an idle target is forgotten
+
+
+class PendingUpdate:
+    def __init__(self, flush: Callable[[str], None]) -> None:
+        self.flush = flush
+        self.chunks: List[str] = []
+        self.scheduled: bool = False
+        self.last_flush: float = 0.0
+        self.lock = threading.Lock()
+
+
+class UpdateScheduler:
+    """Coalesces streamed chunks per target and flushes them at most once per frame interval.
+
+    Every pushed chunk guarantees a flush within one interval, so the tail of a stream
+    is never left behind even if its end isn't signaled explicitly. Targets whose stream
+    ended without `finish` are forgotten once they've been idle for `IDLE_TARGET_TIMEOUT`.
+    """
+
+    def __init__(self, interval_ms: int = DEFAULT_INTERVAL_MS) -> None:
+        self.interval_ms = interval_ms
+        self.chunks_received: int = 0
+        self.flushes: int = 0
+        self._targets: Dict[Hashable, PendingUpdate] = {}
+        self._lock = threading.Lock()
+
+    def push(self, key: Hashable, chunk: str, flush: Callable[[str], None]):
+        """Buffers `chunk` for the `key` target, `flush` receives all the buffered text at once."""
+        with self._lock:
+            self.chunks_received += 1
+            pending = self._targets.get(key)
+            if pending is None:
+                self._forget_idle()
+                pending = self._targets[key] = PendingUpdate(flush)
+            pending.flush = flush
+            pending.chunks.append(chunk)
+            if pending.scheduled:
+                return
+            pending.scheduled = True
+            delay = pending.last_flush + self.interval_ms / 1000 - time.monotonic()
+
+        set_timeout_async(lambda: self.flush(key), max(0, int(delay * 1000)))
+
+    def flush(self, key: Hashable):
+        """Immediately passes everything buffered for `key` to its flush callback."""
+        pending = self._targets.get(key)
+        if pending is None:
+            return
+
+        with pending.lock:
+            with self._lock:
+                pending.scheduled = False
+                if not pending.chunks:
+                    return
+                text = ''.join(pending.chunks)
+                pending.chunks.clear()
+                pending.last_flush = time.monotonic()
+                self.flushes += 1
+            pending.flush(text)
+
+    def finish(self, key: Hashable):
+        """Flushes the rest of the stream for `key` and forgets the target."""
+        self.flush(key)
+        with self._lock:
+            self._targets.pop(key, None)
+        logger.debug('stream %s finished: %s', key, self.stats())
+
+    def finish_all(self):
+        for key in list(self._targets):
+            self.finish(key)
+
+    def _forget_idle(self):
+        now = time.monotonic()
+        for key, pending in list(self._targets.items()):
+            idle = not pending.scheduled and not pending.chunks
+            if idle and now - pending.last_flush > IDLE_TARGET_TIMEOUT:
+                del self._targets[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {'chunks_received': self.chunks_received, 'flushes': self.flushes}
+
+
+update_scheduler = UpdateScheduler()
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import logging
+import socket
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 4
+DEFAULT_IDLE_TIMEOUT = 300  # seconds
+TIMINGS_KEPT = 50
+PROBE_TIMEOUT = 5  # seconds
+
+Key = Tuple[Hashable, ...]  # (window id, cache path, endpoint url, proxy)
+
+
+class PooledWorker:
+    __slots__ = ('key', 'worker', 'created_at', 'last_used', 'requests')
+
+    def __init__(self, key: Key, worker: Any) -> None:
+        self.key = key
+        self.worker = worker
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.requests = 0
+
+
+class RequestTiming:
+    """Time from sending a request to its first streamed chunk, for a new (cold) or a reused (warm) worker."""
+
+    def __init__(self, pool: WorkerPool, warm: bool, setup: float) -> None:
+        self.pool = pool
+        self.warm = warm
+        self.setup = setup  # seconds spent in `acquire`, i.e. on the worker object, no network involved
+        self.started = time.perf_counter()
+        self.first_chunk: float | None = None
+
+    def wrap(self, handler: Callable[[str], None]) -> Callable[[str], None]:
+        """Returns `handler` recording the arrival of the first chunk"""
+
+        def timed_handler(content: str) -> None:
+            if self.first_chunk is None:
+                self.first_chunk = time.perf_counter() - self.started
+                self.pool.record(self)
+            handler(content)
+
+        return timed_handler
+
+
+class WorkerPool:
+    """Keeps `llm_runner` workers alive between requests.
+
+    Workers are keyed by window, cache path, endpoint and proxy; an idle one is reused by the next
+    request with the same key. Workers idle for longer than `idle_timeout` are dropped, and once
+    the pool holds `max_size` workers the least recently used idle one makes room for a new one.
+    A cancelled worker is `discard`ed, it's never handed out again.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[..., Any],
+        max_size: int = DEFAULT_MAX_SIZE,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    ) -> None:
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.created: int = 0
+        self.reused: int = 0
+        self._workers: List[PooledWorker] = []
+        self._timings: Dict[bool, Deque[RequestTiming]] = {
+            True: deque(maxlen=TIMINGS_KEPT),
+            False: deque(maxlen=TIMINGS_KEPT),
+        }
+        self._lock = threading.Lock()
+
+    def acquire(
+        self, window_id: int, path: str, url: str | None, proxy: str | None
+    ) -> Tuple[Any, RequestTiming]:
+        """Returns an idle worker for the key (a new one if there's none) and the timing of its request"""
+        start = time.perf_counter()
+        key = (window_id, path, url, proxy)
+        with self._lock:
+            self._drop_idle()
+            pooled = next((item for item in self._workers if item.key == key and not _is_busy(item)), None)
+            warm = pooled is not None
+            if pooled is None:
+                self._make_room()
+                pooled = PooledWorker(key, self.factory(window_id=window_id, path=path, proxy=proxy))
+                self._workers.append(pooled)
+                self.created += 1
+            else:
+                self.reused += 1
+            pooled.last_used = time.monotonic()
+            pooled.requests += 1
+        return pooled.worker, RequestTiming(self, warm, time.perf_counter() - start)
+
+    def prewarm(self, window_id: int, path: str, url: str | None, proxy: str | None):
+        """Makes sure an idle worker for the key is ready to be taken by the next `acquire`"""
+        key = (window_id, path, url, proxy)
+        with self._lock:
+            self._drop_idle()
+            pooled = next((item for item in self._workers if item.key == key and not _is_busy(item)), None)
+            if pooled is None:
+                self._make_room()
+                pooled = PooledWorker(key, self.factory(window_id=window_id, path=path, proxy=proxy))
+                self._workers.append(pooled)
+                self.created += 1
+            pooled.last_used = time.monotonic()
+
+    def discard(self, worker: Any):
+        """Drops `worker` from the pool, so no later `acquire` returns it"""
+        with self._lock:
+            self._workers = [item for item in self._workers if item.worker is not worker]
+
+    def record(self, timing: RequestTiming):
+        with self._lock:
+            self._timings[timing.warm].append(timing)
+        logger.debug(
+            '%s worker: setup %.1f ms, first chunk after %.1f ms',
+            'warm' if timing.warm else 'cold',
+            timing.setup * 1000,
+            (timing.first_chunk or 0) * 1000,
+        )
+
+    def clear(self):
+        with self._lock:
+            self._workers.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result: Dict[str, Any] = {
+                'workers': len(self._workers),
+                'created': self.created,
+                'reused': self.reused,
+            }
+            for warm, timings in self._timings.items():
+                label = 'warm' if warm else 'cold'
+                if timings:
+                    result[f'{label}_setup_ms'] = statistics.median(timing.setup for timing in timings) * 1000
+                    result[f'{label}_first_chunk_ms'] = (
+                        statistics.median(timing.first_chunk or 0 for timing in timings) * 1000
+                    )
+            return result
+
+    def _drop_idle(self):
+        now = time.monotonic()
+        self._workers = [
+            item for item in self._workers if _is_busy(item) or now - item.last_used <= self.idle_timeout
+        ]
+
+    def _make_room(self):
+        idle = [item for item in self._workers if not _is_busy(item)]
+        idle.sort(key=lambda item: item.last_used)
+        while len(self._workers) >= self.max_size and idle:
+            self._workers.remove(idle.pop(0))
+
+
+def _is_busy(item: PooledWorker) -> bool:
+    try:
+        return bool(item.worker.is_alive())
+    except Exception:
+        return False
+
+
+def probe_endpoint(url: str, proxy: str | None, timeout: float = PROBE_TIMEOUT) -> float:
+    """Checks that the host of `url` (or the `proxy`) accepts connections, closing the connection at once.
+    Returns the connect time in seconds, raises OSError if it can't be reached and ValueError if the url
+    (or the proxy) is malformed."""
+    target = urlsplit(proxy if '://' in (proxy or '') else f'http://{proxy}') if proxy else urlsplit(url)
+    host = target.hostname or ''
+    port = target.port or (443 if target.scheme == 'https' else 80)
+    start = time.perf_counter()
+    with socket.create_connection((host, port), timeout=timeout):
+        return time.perf_counter() - start
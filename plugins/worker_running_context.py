@@ -18,10 +18,6 @@ class OpenaiWorkerRunningContext(EventListener):
         match_all: bool,
     ):
         if key == 'openai_worker_running':
-            logger.debug('key == openai_worker_running')
-            logger.debug(
-                'CommonMethods.worker_thread is alive: %s',
-                CommonMethods.is_worker_alive() if CommonMethods.worker else False,
-            )
-            return CommonMethods.worker and CommonMethods.is_worker_alive()
+            # Runs on every ctrl+c press, so it only reads the flag the requests keep up to date
+            return CommonMethods.is_worker_alive(view)
         return None
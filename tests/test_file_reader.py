@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+import tempfile
+from unittest import TestCase
+
+try:
+    file_reader = sys.modules['OpenAI completion.plugins.file_reader']
+    file_cache = sys.modules['OpenAI completion.plugins.file_cache']
+except KeyError:  # outside of Sublime Text
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from plugins import file_cache, file_reader
+
+
+class TestLineIndex(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, data: bytes) -> str:
+        path = os.path.join(self.directory.name, 'file.txt')
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def expected(self, lines, first: int, last):
+        last = len(lines) - 1 if last is None else min(last, len(lines) - 1)
+        return '\n'.join(lines[max(0, first) : last + 1])
+
+    def test_reads_ranges(self):
+        data = b'zero\none\r\ntwo\n\nfour'
+        index = file_reader.LineIndex(self.write(data))
+        self.assertEqual(index.read(0, 0), 'zero')
+        self.assertEqual(index.read(1, 2), 'one\ntwo')
+        self.assertEqual(index.read(3, 4), '\nfour')
+        self.assertEqual(index.read(2), 'two\n\nfour')
+        self.assertEqual(index.read(4, 100), 'four')
+        self.assertEqual(index.read(10, 20), '')
+
+    def test_empty_file(self):
+        index = file_reader.LineIndex(self.write(b''))
+        self.assertEqual(index.read(0, 10), '')
+
+    def test_trailing_line_break(self):
+        index = file_reader.LineIndex(self.write(b'a\nb\n'))
+        self.assertEqual(index.read(1, 1), 'b')
+        self.assertEqual(index.read(2, 2), '')
+
+    def test_matches_split_in_any_order(self):
+        # Reads in random order exercise the lazy scan stopping and resuming at chunk boundaries
+        rng = random.Random(2)
+        words = [b'', b'x', b'abc', b'\xd0\xb6\xd0\xb8', b'a\r']
+        data = b'\n'.join(rng.choice(words) for _ in range(150000))
+        path = self.write(data)
+        lines = data.decode('utf-8').replace('\r\n', '\n').split('\n')
+        for threshold in (file_reader.MMAP_THRESHOLD, 0):  # read whole, then memory-mapped
+            original = file_reader.MMAP_THRESHOLD
+            file_reader.MMAP_THRESHOLD = threshold
+            try:
+                index = file_reader.LineIndex(path)
+                for _ in range(200):
+                    first = rng.randint(0, 150100)
+                    last = rng.choice([None, first + rng.randint(0, 50)])
+                    self.assertEqual(
+                        index.read(first, last), self.expected(lines, first, last), (first, last)
+                    )
+            finally:
+                file_reader.MMAP_THRESHOLD = original
+
+    def test_cached_read_matches(self):
+        path = self.write(b'a\r\nb\rc\n\r\nd\r')
+        index = file_reader.LineIndex(path)
+        cached = file_cache.FileCache().get(path)
+        for first in range(5):
+            for last in (None, *range(first, 5)):
+                self.assertEqual(cached.lines(first, last), index.read(first, last), (first, last))
@@ -0,0 +1,97 @@
+import os
+import random
+import sys
+from unittest import TestCase
+
+try:
+    hunk_matcher = sys.modules['OpenAI completion.plugins.hunk_matcher']
+except KeyError:  # outside of Sublime Text
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from plugins import hunk_matcher
+
+
+class TestApplyHunks(TestCase):
+    def test_replaces_first_occurrence_ignoring_indentation(self):
+        original = 'def f():\n    return 1\n\ndef g():\n    return 1\n'
+        result = hunk_matcher.apply_hunks(original, [('return 1\n', '    return 2\n')])
+        self.assertEqual(result, 'def f():\n    return 2\n\ndef g():\n    return 1\n')
+
+    def test_hunks_apply_in_order(self):
+        original = 'a\nb\na\nb\n'
+        result = hunk_matcher.apply_hunks(original, [('a\n', 'x\n'), ('a\n', 'y\n')])
+        self.assertEqual(result, 'x\nb\ny\nb\n')
+
+    def test_empty_old_block_appends(self):
+        self.assertEqual(hunk_matcher.apply_hunks('a\n', [('', 'b\n')]), 'a\nb\n')
+
+    def test_missing_context_raises(self):
+        with self.assertRaises(RuntimeError):
+            hunk_matcher.apply_hunks('a\nb\n', [('c\n', 'd\n')])
+
+    def test_matches_sequential_scan(self):
+        # The indexed fast path has to give the same result as the plain scan, errors included
+        rng = random.Random(1)
+        alphabet = ['a\n', 'b\n', ' a\n', 'c\n', '\n']
+
+        def run(apply, original, hunks):
+            try:
+                return apply(original, hunks)
+            except RuntimeError:
+                return RuntimeError
+
+        for _ in range(3000):
+            original = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+            hunks = [
+                (
+                    ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 3))),
+                    ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 3))),
+                )
+                for _ in range(rng.randint(1, 4))
+            ]
+            self.assertEqual(
+                run(hunk_matcher.apply_hunks, original, hunks),
+                run(hunk_matcher.apply_hunks_by_scan, original, hunks),
+                (original, hunks),
+            )
+
+
+class TestApplyHunksFuzzy(TestCase):
+    def test_exact_match_has_full_confidence(self):
+        text, confidences = hunk_matcher.apply_hunks_fuzzy('a\nb\nc\n', [('b\n', 'x\n')])
+        self.assertEqual(text, 'a\nx\nc\n')
+        self.assertEqual(confidences, [1.0])
+
+    def test_one_changed_line_is_located(self):
+        original = 'one\ntwo = 2\nthree = 3\nfour = 4\nfive\n'
+        old = 'two = 2\nthree = 33\nfour = 4\n'
+        text, confidences = hunk_matcher.apply_hunks_fuzzy(original, [(old, 'replaced\n')])
+        self.assertEqual(text, 'one\nreplaced\nfive\n')
+        self.assertGreaterEqual(confidences[0], hunk_matcher.MIN_CONFIDENCE)
+        self.assertLess(confidences[0], 1.0)
+
+    def test_hint_picks_the_nearest_candidate(self):
+        block = ['x = 1\n', 'y = 2\n', 'z = 3\n']
+        lines = block + ['pad\n'] * 50 + block
+        old = 'x = 1\ny = 20\nz = 3\n'
+        text, _ = hunk_matcher.apply_hunks_fuzzy(''.join(lines), [(old, 'new\n')], [54])
+        self.assertEqual(text, ''.join(block + ['pad\n'] * 50 + ['new\n']))
+
+    def test_unrelated_context_raises(self):
+        with self.assertRaises(RuntimeError):
+            hunk_matcher.apply_hunks_fuzzy('alpha\nbeta\ngamma\n', [('one\ntwo\nthree\n', 'x\n')])
+
+    def test_short_hunk_is_not_located_approximately(self):
+        with self.assertRaises(RuntimeError):
+            hunk_matcher.apply_hunks_fuzzy('value = 1\nother = 2\n', [('value = 10\n', 'value = 3\n')])
+
+    def test_equally_good_locations_raise(self):
+        block = ['x = 1\n', 'y = 2\n', 'z = 3\n']
+        lines = block + ['pad\n'] * 50 + block
+        with self.assertRaisesRegex(RuntimeError, 'equally well'):
+            hunk_matcher.apply_hunks_fuzzy(''.join(lines), [('x = 1\ny = 20\nz = 3\n', 'new\n')])
+
+    def test_far_location_is_found_without_hint(self):
+        lines = [f'line {i}\n' for i in range(1000)]
+        old = 'line 700\nline 701;\nline 702\n'
+        text, _ = hunk_matcher.apply_hunks_fuzzy(''.join(lines), [(old, 'new\n')])
+        self.assertEqual(text, ''.join(lines[:700] + ['new\n'] + lines[703:]))
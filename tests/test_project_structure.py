@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import TestCase, skipUnless
+
+try:
+    project_structure = sys.modules['OpenAI completion.plugins.project_structure']
+except KeyError:  # outside of Sublime Text
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from plugins import project_structure
+
+
+def _has_git() -> bool:
+    try:
+        return subprocess.run(['git', '--version'], capture_output=True).returncode == 0
+    except OSError:
+        return False
+
+
+@skipUnless(_has_git(), 'git is not installed')
+class TestIgnoreChecker(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        subprocess.run(['git', 'init', '-q', self.root], check=True)
+        self.checker = project_structure.IgnoreChecker(self.root)
+
+    def tearDown(self):
+        self.checker.close()
+        project_structure.close_ignore_checkers()
+        self.directory.cleanup()
+
+    def write(self, relative_path: str, content: str = ''):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            file.write(content)
+
+    def test_negated_pattern_is_not_ignored(self):
+        self.write('.gitignore', '*.log\n!keep.log\n')
+        for name in ('a.log', 'keep.log', 'b.txt'):
+            self.write(name)
+        dirs, files, ignored = self.checker.scan_dir(self.root)
+        self.assertEqual(dirs, [])
+        self.assertEqual(files, ['.gitignore', 'b.txt', 'keep.log'])
+        self.assertEqual(ignored, ['a.log'])
+
+    def test_nested_ignore_file_change_is_noticed(self):
+        self.write('sub/deep/a.tmp')
+        self.write('sub/deep/b.txt')
+        self.write('sub/.gitignore', '')
+        deep = os.path.join(self.root, 'sub', 'deep')
+        self.assertEqual(list(self.checker.walk(self.root))[-1], (deep, [], ['a.tmp', 'b.txt']))
+
+        self.write('sub/.gitignore', '*.tmp\n')
+        stat = os.stat(os.path.join(self.root, 'sub', '.gitignore'))
+        os.utime(os.path.join(self.root, 'sub', '.gitignore'), (stat.st_atime, stat.st_mtime + 10))
+        self.assertEqual(list(self.checker.walk(self.root))[-1], (deep, [], ['b.txt']))
+
+    def test_ignored_files_relative_to_a_subfolder(self):
+        self.write('.gitignore', 'sub/*.tmp\n')
+        self.write('sub/a.tmp')
+        self.write('sub/b.txt')
+        sub = os.path.join(self.root, 'sub')
+        self.assertEqual(project_structure.get_ignored_files(['a.tmp', 'b.txt'], sub), {'a.tmp'})